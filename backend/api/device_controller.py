@@ -1,30 +1,209 @@
+import asyncio
+import json
+
 from fastapi import APIRouter, HTTPException, Query, Request, UploadFile, File, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from backend.enrichment.snmp_enricher import snmp_get_status_v3, snmp_get_status_v2c
+from backend.enrichment.snmp_enricher import detect_snmp_version as detect_snmp_version_cached
+from backend.snmp.SNMPCapabilityCache import SNMPCapabilityCache
 from backend.services.DeviceService import DeviceService
-from backend.services.BandwidthService import BandwidthService
 from backend.services.DiscoveryService import DiscoveryService
-from backend.utils.network_utils import get_local_ip, get_netmask_for_ip, get_cidr_from_ip
-from config.ConfigLoader import ConfigLoader
+from backend.services.EnrichmentJobService import EnrichmentJobService
+from backend.services.BandwidthPoller import BandwidthPoller
+from backend.services.EventBus import EventBus
+from backend.services.NeighborService import NeighborService
+from backend.services.ScanJobService import ScanJobService
+from backend.utils.network_utils import get_local_ip, get_local_subnets, get_netmask_for_ip, get_cidr_from_ip
 from backend.services.NetworkIOService import NetworkIOService
 
 router = APIRouter()
 
 
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
 @router.get("/devices")
-def get_devices():
-    return {"devices": DeviceService.get_devices()}
+def get_devices(request: Request, revalidate: bool = False, type: str | None = None, tag: str | None = None):
+    """
+    Last known devices and the snapshot's age; with `revalidate`, stale
+    subnets are rescanned in the background. `type` and `tag` filter the
+    devices through the store's indexes.
+
+    The ETag is the device store's version token, so `If-None-Match` is
+    answered with 304 until a device actually changes, and never across a
+    server restart.
+    """
+    snapshot = DeviceService.get_snapshot()
+    etag = f'"{snapshot.token}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    result = DiscoveryService.discover_lan_devices(revalidate, snapshot)
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    # Filter on the same snapshot the ETag names
+    if type:
+        ids = {d["id"] for d in snapshot.by_type(type)}
+        result["devices"] = [d for d in result["devices"] if d["id"] in ids]
+    if tag:
+        ids = {d["id"] for d in snapshot.by_tag(tag)}
+        result["devices"] = [d for d in result["devices"] if d["id"] in ids]
+    return JSONResponse(result, headers=headers)
+
+
+@router.get("/devices/changes")
+def get_device_changes(since: str = Query(...)):
+    """
+    Devices added, changed or removed since the version token `since` (the
+    `version` / ETag of an earlier response). Falls back to a full snapshot,
+    flagged with "full": true, when the change log no longer reaches back
+    that far or the token is from before a server restart.
+    """
+    return DeviceService.changes_since(since)
 
 
 @router.post("/devices/scan")
 def scan_devices():
-    devices = DiscoveryService.discover_lan_devices()
-    DeviceService.set_devices(devices)
-    return {"devices": devices}
+    """Returns the cached devices at once and refreshes stale subnets in the background."""
+    return DiscoveryService.discover_lan_devices()
+
+
+@router.post("/devices/scans", status_code=202)
+def submit_scan(subnets: list[str] | None = Query(None)):
+    """Starts a background scan and returns its job; concurrent requests share one job."""
+    try:
+        job, created = ScanJobService.submit(subnets)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"job": job.to_dict(include_devices=False), "created": created}
+
+
+@router.get("/devices/scans")
+def list_scans():
+    return {"jobs": ScanJobService.list_jobs()}
+
+
+@router.get("/devices/scans/{job_id}")
+def get_scan(job_id: str):
+    job = ScanJobService.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    return {"job": job.to_dict()}
+
+
+@router.delete("/devices/scans/{job_id}")
+def cancel_scan(job_id: str):
+    job = ScanJobService.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    return {"job": job.to_dict(include_devices=False)}
+
+
+@router.get("/devices/scans/{job_id}/stream")
+async def stream_scan(request: Request, job_id: str):
+    """
+    Server-Sent Events stream of one scan job: 'device' events with partial
+    results as hosts finish, 'subnet' events as subnets complete, and a final
+    'finished' event carrying the job summary, after which the stream closes.
+    """
+    job = ScanJobService.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    subscription = EventBus.subscribe({"scans"})
+
+    async def events():
+        try:
+            # Replay what was found before the client connected
+            yield f"event: progress\ndata: {json.dumps(job.to_dict())}\n\n"
+            if not job.running:
+                return
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+
+                data = event["data"]
+                if data["job_id"] != job_id:
+                    continue
+                yield f"event: {data['type']}\ndata: {json.dumps(data)}\n\n"
+                if data["type"] == "finished":
+                    break
+        finally:
+            EventBus.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.post("/devices/neighbors/refresh")
+def refresh_from_neighbor_table(add_new: bool | None = None):
+    """Refreshes device liveness from the kernel neighbor table; sends no packets."""
+    try:
+        report = NeighborService.refresh(add_new)
+    except OSError as e:
+        raise HTTPException(status_code=501, detail=f"Neighbor table unavailable: {e}")
+    return {"devices": DeviceService.get_devices(), "report": report}
+
+
+@router.get("/devices/bandwidth")
+def get_fleet_bandwidth(ip: list[str] | None = Query(None)):
+    devices = DeviceService.get_devices()
+    if ip:
+        wanted = set(ip)
+        devices = [d for d in devices if d["ip"] in wanted]
+
+    devices = [d for d in devices if d.get("snmp_version") in ("v2c", "v3")]
+    return {"devices": BandwidthPoller.latest_many(devices)}
+
+
+@router.get("/devices/stream")
+async def stream_updates(request: Request, topics: str = Query("bandwidth,devices"), ip: str | None = None):
+    """
+    Server-Sent Events stream of bandwidth samples, device-state changes and
+    enrichment job progress.
+
+    `topics` is a comma separated subset of 'bandwidth', 'devices' and
+    'enrichment'; `ip` limits bandwidth and enrichment events to a single device.
+    """
+    wanted = {t.strip() for t in topics.split(",")} & {"bandwidth", "devices", "enrichment"}
+    if not wanted:
+        raise HTTPException(status_code=400, detail="No valid topics requested")
+    subscription = EventBus.subscribe(wanted)
+
+    async def events():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+
+                data = event["data"]
+                if ip and event["topic"] == "bandwidth":
+                    data = {**data, "devices": [d for d in data["devices"] if d["ip"] == ip]}
+                    if not data["devices"]:
+                        continue
+                if ip and event["topic"] == "enrichment" and ip not in data["job"]["ips"]:
+                    continue
+                yield f"event: {event['topic']}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            EventBus.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 @router.get("/devices/{ip}/bandwidth")
-def get_bandwidth(ip: str, mac: str = Query(...)):
+def get_bandwidth(ip: str, mac: str = Query(...), history: int = Query(0, ge=0)):
     device = DeviceService.get_cached_device(ip)
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
@@ -33,50 +212,74 @@ def get_bandwidth(ip: str, mac: str = Query(...)):
     if snmp_version not in ("v2c", "v3"):
         return {"in_kbps": 0.0, "out_kbps": 0.0}
 
+    # Served from the background poller's buffers; no SNMP traffic here
+    result = BandwidthPoller.latest(ip, mac)
+    if history:
+        result["history"] = BandwidthPoller.history(ip, mac, history)
+    return result
+
+
+def _submit_enrichment(ip: str, source: str, priority: str, refresh: bool) -> dict:
+    # Concurrent requests for the same device and source share one in-flight job
+    if not DeviceService.get_device_by_ip(ip):
+        raise HTTPException(status_code=404, detail="Device not found")
     try:
-        return BandwidthService.get_bandwidth(ip, mac, snmp_version=snmp_version)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Bandwidth fetch failed: {str(e)}")
+        job, created = EnrichmentJobService.submit(ip, source, priority, refresh)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"job": job.to_dict(), "created": created}
+
 
+@router.post("/devices/enrich/nmap", status_code=202)
+def enrich_nmap(ip: str, refresh: bool = False, priority: str = "normal"):
+    """Queues an nmap enrichment job and returns its handle."""
+    return _submit_enrichment(ip, "nmap", priority, refresh)
 
 
-@router.post("/devices/enrich/nmap")
-def enrich_nmap(ip: str):
+@router.post("/devices/enrich/nmap/batch", status_code=202)
+def enrich_nmap_batch(ips: list[str] = Query(None), refresh: bool = False, priority: str = "low"):
+    """Queues one nmap job for the given devices (default: all), scanned in shared nmap runs."""
     try:
-        return DeviceService.enrich_with_nmap(ip)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        job, created = EnrichmentJobService.submit_batch(ips, priority, refresh)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"job": job.to_dict(), "created": created}
 
 
-@router.post("/devices/enrich/snmp")
-def enrich_snmp(ip: str):
-    try:
-        return DeviceService.enrich_with_snmp(ip)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@router.post("/devices/enrich/snmp", status_code=202)
+def enrich_snmp(ip: str, refresh: bool = False, priority: str = "normal"):
+    return _submit_enrichment(ip, "snmp", priority, refresh)
 
 
-@router.post("/devices/enrich/both")
-def enrich_both(ip: str):
-    try:
-        return DeviceService.enrich_with_both(ip)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@router.post("/devices/enrich/both", status_code=202)
+def enrich_both(ip: str, refresh: bool = False, priority: str = "normal"):
+    return _submit_enrichment(ip, "both", priority, refresh)
+
+
+@router.get("/devices/enrichments")
+def list_enrichments(ip: str | None = None):
+    return {"jobs": EnrichmentJobService.list_jobs(ip)}
+
+
+@router.get("/devices/enrichments/{job_id}")
+def get_enrichment(job_id: str):
+    job = EnrichmentJobService.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Enrichment job not found")
+    return {"job": job.to_dict()}
 
 
 @router.get("/devices/{ip}/snmp_version", summary="Detect active SNMP version")
-def detect_snmp_version(ip: str):
-    config = ConfigLoader()
-    v3_conf = config.get("snmp_v3", {})
-    user = v3_conf.get("username", "admin")
-    auth_key = v3_conf.get("auth_key", "admin123")
-    auth_protocol = v3_conf.get("auth_protocol", "SHA")
-
-    if snmp_get_status_v3(ip, user, auth_key):
-        return {"snmp_version": "v3"}
-    elif snmp_get_status_v2c(ip, "public"):
-        return {"snmp_version": "v2c"}
-    return {"snmp_version": None}
+def detect_snmp_version(ip: str, refresh: bool = False):
+    device = DeviceService.get_device_by_ip(ip)
+    mac = device.get("mac") if device else None
+    version = detect_snmp_version_cached(ip, mac, force=refresh)
+    entry = SNMPCapabilityCache.get(ip, mac) or {}
+    return {
+        "snmp_version": version,
+        "detected_at": entry.get("detected_at"),
+        "error": entry.get("error"),
+    }
 
 @router.post("/devices/{ip}/change_type")
 async def change_device_type(ip: str, request: Request):
@@ -102,7 +305,7 @@ def get_cidr():
     ip = get_local_ip()
     netmask = get_netmask_for_ip(ip)
     cidr = get_cidr_from_ip(ip, netmask)
-    return {"cidr": cidr}
+    return {"cidr": cidr, "subnets": get_local_subnets()}
 
 @router.get("/devices/export")
 def export_devices():
@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from config.ConfigLoader import ConfigLoader
+
+
+class EnrichmentCache:
+    """
+    On-disk cache of enrichment results, keyed by MAC and source.
+
+    Sources are 'nmap', 'snmp' and 'vendor'; each stores only the device
+    fields it produces and expires after its own TTL. The cache is a JSON
+    file, so results survive a restart and newly discovered devices can be
+    served enriched at once. Stores only update memory; the file is
+    rewritten atomically (and expired entries dropped) at most once per
+    `flush_delay` seconds, and on `flush()` at shutdown. Configured in
+    config.json:
+
+        "enrichment_cache": {"path": "data/enrichment_cache.json", "flush_delay": 5,
+                             "ttl": {"nmap": 86400, "snmp": 3600, "vendor": 2592000}}
+    """
+
+    SOURCE_FIELDS = {
+        "vendor": ("vendor",),
+        "nmap": ("hostname", "os", "ports"),
+        "snmp": ("snmp_version", "hostname", "os", "device_uptime"),
+    }
+
+    DEFAULT_PATH = "data/enrichment_cache.json"
+    DEFAULT_TTL = {"nmap": 86400, "snmp": 3600, "vendor": 2592000}
+    DEFAULT_FLUSH_DELAY = 5.0
+
+    _entries = None
+    _lock = threading.Lock()
+    _flush_timer = None
+
+    @classmethod
+    def _settings(cls) -> dict:
+        conf = ConfigLoader().get("enrichment_cache", {})
+        return {
+            "path": Path(conf.get("path", cls.DEFAULT_PATH)),
+            "flush_delay": float(conf.get("flush_delay", cls.DEFAULT_FLUSH_DELAY)),
+            "ttl": {**cls.DEFAULT_TTL, **conf.get("ttl", {})},
+        }
+
+    @staticmethod
+    def _key(mac: str) -> str:
+        return (mac or "").lower().replace("-", ":")
+
+    @classmethod
+    def _load(cls) -> dict:
+        # Called with the lock held
+        if cls._entries is None:
+            path = cls._settings()["path"]
+            try:
+                with path.open("r", encoding="utf-8") as f:
+                    cls._entries = json.load(f)
+            except FileNotFoundError:
+                cls._entries = {}
+            except (OSError, ValueError) as e:
+                print(f"[!] Enrichment cache unreadable, starting empty: {e}")
+                cls._entries = {}
+        return cls._entries
+
+    @classmethod
+    def _save(cls) -> None:
+        # Called with the lock held; drops expired entries while writing
+        settings = cls._settings()
+        now = time.time()
+        for mac in list(cls._entries):
+            sources = cls._entries[mac]
+            for source in list(sources):
+                if now - sources[source]["stored_at"] > settings["ttl"].get(source, 0):
+                    del sources[source]
+            if not sources:
+                del cls._entries[mac]
+
+        path = settings["path"]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(cls._entries, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def get(cls, mac: str, source: str) -> dict | None:
+        """
+        Fresh cached fields from `source` for a MAC, or None on a miss.
+
+        A cached SNMP uptime is advanced by the time since it was stored.
+        """
+        ttl = cls._settings()["ttl"].get(source, 0)
+        with cls._lock:
+            entry = cls._load().get(cls._key(mac), {}).get(source)
+            if entry is None:
+                return None
+            age = time.time() - entry["stored_at"]
+            if age > ttl:
+                return None
+            data = dict(entry["data"])
+        if data.get("device_uptime"):
+            data["device_uptime"] = float(data["device_uptime"]) + age
+        return data
+
+    @classmethod
+    def store(cls, mac: str, source: str, device: dict) -> dict:
+        """Records the `source` fields of an enriched device; returns what was stored."""
+        if not mac:
+            return {}
+        data = {field: device[field] for field in cls.SOURCE_FIELDS[source] if field in device}
+        with cls._lock:
+            cls._load().setdefault(cls._key(mac), {})[source] = {"stored_at": time.time(), "data": data}
+            if cls._flush_timer is None:
+                # Stores arriving until the timer fires share one write
+                cls._flush_timer = threading.Timer(cls._settings()["flush_delay"], cls.flush)
+                cls._flush_timer.daemon = True
+                cls._flush_timer.start()
+        return data
+
+    @classmethod
+    def flush(cls) -> None:
+        """Writes pending stores to disk now."""
+        with cls._lock:
+            if cls._flush_timer is None:
+                return
+            cls._flush_timer.cancel()
+            cls._flush_timer = None
+            try:
+                cls._save()
+            except OSError as e:
+                print(f"[!] Failed to write enrichment cache: {e}")
+
+    @classmethod
+    def fields_for(cls, mac: str) -> dict:
+        """All fresh cached fields for a MAC; SNMP wins over nmap where both set a field."""
+        fields = {}
+        for source in ("vendor", "nmap", "snmp"):
+            fields.update(cls.get(mac, source) or {})
+        return fields
@@ -1,7 +1,23 @@
 import subprocess
-import nmap
+import tempfile
+import xml.etree.ElementTree as ET
+from typing import Iterable, Iterator
 
-scanner = nmap.PortScanner()
+from config.ConfigLoader import ConfigLoader
+
+# Discovery finds the open ports cheaply; service detection (-sV) runs only on ports that
+# changed. OS detection (-O) needs an open and a closed port, so it keeps nmap's default port list.
+DEFAULT_NMAP_SETTINGS = {
+    "discovery_arguments": "-sS -T4",
+    "service_arguments": "-sS -sV -T4",
+    "os_arguments": "-sS -O -T4",
+    "batch_size": 64,
+}
+
+def nmap_settings() -> dict:
+    settings = dict(DEFAULT_NMAP_SETTINGS)
+    settings.update(ConfigLoader().get("nmap", {}))
+    return settings
 
 def is_device_up_ping(ip):
     cmd = ["ping", "-c", "1", "-W", "1", ip]  # For Linux/macOS
@@ -29,53 +45,226 @@ def normalize_nmap_port_data(port_data, port_number, protocol):
         "version": version
     }
 
-def scan_host(ip):
-    try:
-        scanner.scan(ip, arguments='-sS -sV -O -T4')
-        if ip not in scanner.all_hosts():
-            return None
-        return scanner[ip]
-    except Exception as e:
-        print(f"[!] Nmap scan error on {ip}: {e}")
-        return None
-
-def extract_hostname(scan_result):
-    return scan_result.hostname() or "Unknown"
+def extract_hostname(host: ET.Element) -> str:
+    # Like python-nmap: a user supplied name wins over the PTR record
+    names = host.findall("hostnames/hostname")
+    for name in names:
+        if name.get("type") == "user":
+            return name.get("name") or "Unknown"
+    return (names[0].get("name") if names else None) or "Unknown"
 
-def extract_os(scan_result):
-    os_matches = scan_result.get('osmatch', [])
-    return os_matches[0]['name'] if os_matches else "Unknown"
+def extract_os(host: ET.Element) -> str:
+    match = host.find("os/osmatch")
+    return match.get("name") if match is not None else "Unknown"
 
-def extract_ports(scan_result):
+def extract_ports(host: ET.Element) -> list[dict]:
     seen_ports = set()
     ports = []
 
-    for proto in scan_result.all_protocols():
+    for port in host.findall("ports/port"):
+        proto = port.get("protocol")
         if proto not in ("tcp", "udp"):
             continue
-        for port in scan_result[proto]:
-            key = (port, proto)
-            if key in seen_ports:
-                continue
-            seen_ports.add(key)
-            port_data = scan_result[proto][port]
-            normalized = normalize_nmap_port_data(port_data, port, proto)
-            ports.append(normalized)
+        key = (int(port.get("portid")), proto)
+        if key in seen_ports:
+            continue
+        seen_ports.add(key)
+        state = port.find("state")
+        service = port.find("service")
+        port_data = dict(service.attrib) if service is not None else {}
+        port_data["state"] = state.get("state") if state is not None else "unknown"
+        ports.append(normalize_nmap_port_data(port_data, key[0], proto))
 
     return ports
 
-def enrich_device_with_nmap(device):
-    ip = device.get('ip')
+def parse_host(host: ET.Element) -> dict | None:
+    """Device fields for one <host> element of nmap's XML output; None if the host is down."""
+    status = host.find("status")
+    if status is not None and status.get("state") != "up":
+        return None
+    addresses = {a.get("addrtype"): a.get("addr") for a in host.findall("address")}
+    ip = addresses.get("ipv4") or addresses.get("ipv6")
+    if not ip:
+        return None
+    return {
+        "ip": ip,
+        "mac": addresses.get("mac"),
+        "hostname": extract_hostname(host),
+        "os": extract_os(host),
+        "ports": extract_ports(host),
+    }
+
+def stream_nmap(targets: list[str], arguments: str = None) -> Iterator[dict]:
+    """
+    Runs one nmap process over `targets` and yields each host as soon as nmap reports it.
+
+    nmap writes XML to stdout (`-oX -`) and flushes every finished <host>
+    element; the output is fed line by line into a pull parser, so a result
+    is available while the rest of the batch is still being scanned.
+
+    Raises:
+        RuntimeError: If nmap cannot be started or exits with an error.
+    """
+    if not targets:
+        return
+    cmd = ["nmap", *(arguments or nmap_settings()["service_arguments"]).split(), "-oX", "-", *targets]
+    # stderr goes to a file so a chatty nmap can never block on a full pipe
+    stderr_file = tempfile.TemporaryFile()
+    try:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+    except OSError as e:
+        stderr_file.close()
+        raise RuntimeError(f"Cannot run nmap: {e}")
+
+    parser = ET.XMLPullParser(events=("end",))
+    try:
+        for line in process.stdout:
+            parser.feed(line)
+            for _, element in parser.read_events():
+                if element.tag != "host":
+                    continue
+                result = parse_host(element)
+                element.clear()
+                if result:
+                    yield result
+    finally:
+        if process.poll() is None:
+            # The consumer stopped early
+            process.kill()
+        process.stdout.close()
+        returncode = process.wait()
+        stderr_file.seek(0)
+        stderr = stderr_file.read().decode(errors="replace").strip()
+        stderr_file.close()
+
+    if returncode != 0:
+        raise RuntimeError(f"nmap exited with {returncode}: {stderr}")
+
+def _port_key(port: dict) -> tuple:
+    return int(port["port"]), port.get("protocol", "tcp")
+
+def diff_ports(known: list[dict], found: list[dict]) -> tuple[list[dict], list[dict]]:
+    """
+    Compares a discovery pass with the stored port mappings of a host.
+
+    Returns:
+        tuple: the stored mappings of ports whose status is unchanged (reused
+        as they are), and the discovered ports that are new or changed.
+    """
+    known = {_port_key(p): p for p in known or []}
+    reused, changed = [], []
+    for port in found:
+        previous = known.get(_port_key(port))
+        if previous is not None and previous.get("status") == port["status"]:
+            reused.append(previous)
+        else:
+            changed.append(port)
+    return reused, changed
+
+def _port_spec(ports: list[dict]) -> str:
+    by_proto = {}
+    for port, proto in sorted({_port_key(p) for p in ports}):
+        by_proto.setdefault(proto, []).append(str(port))
+    return ",".join(f"{proto[0].upper()}:{','.join(numbers)}" for proto, numbers in sorted(by_proto.items()))
+
+def _apply_scan(device: dict, result: dict | None) -> dict:
     device['hostname'] = "Unknown"
     device['os'] = "Unknown"
     device['ports'] = []
+    if result:
+        device['hostname'] = result["hostname"]
+        device['os'] = result["os"]
+        device['ports'] = result["ports"]
+    return device
 
-    scan_result = scan_host(ip)
-    if not scan_result:
-        return device
+def _merge_detection(device: dict, discovered: dict, reused: list[dict], changed: list[dict],
+                     services: dict | None, os_scan: dict | None) -> dict:
+    # Detected mappings replace the discovery entries of changed ports; a port detection missed keeps them
+    detected_ports = {_port_key(p): p for p in (services or {}).get("ports", [])}
+    ports = reused + [detected_ports.get(_port_key(p), p) for p in changed]
+    ports.sort(key=_port_key)
+    hostname = discovered["hostname"]
+    for detected in (services, os_scan):
+        if detected and detected["hostname"] != "Unknown":
+            hostname = detected["hostname"]
+    os_name = os_scan["os"] if os_scan else device.get("os") or "Unknown"
+    return _apply_scan(device, {"hostname": hostname, "os": os_name, "ports": ports})
 
-    device['hostname'] = extract_hostname(scan_result)
-    device['os'] = extract_os(scan_result)
-    device['ports'] = extract_ports(scan_result)
+def _collect(targets: list[str], arguments: str, stage: str) -> dict[str, dict]:
+    results = {}
+    try:
+        for result in stream_nmap(targets, arguments):
+            results[result["ip"]] = result
+    except RuntimeError as e:
+        print(f"[!] Nmap {stage} error: {e}")
+    return results
 
-    return device
+def _scan_tiered(pending: dict[str, dict], reuse: bool) -> Iterator[dict]:
+    """
+    Tiered scan of one batch of devices, keyed by IP; yields each device as it is done.
+
+    Hosts whose open ports match their stored mappings are finished after
+    the discovery pass, keeping their stored service and OS details. The
+    others get one service detection run limited to the union of their new
+    or changed open ports, then one OS detection run. With `reuse=False`
+    every host goes through both.
+    """
+    settings = nmap_settings()
+    to_detect = {}
+    try:
+        for discovered in stream_nmap(list(pending), settings["discovery_arguments"]):
+            device = pending.pop(discovered["ip"], None)
+            if device is None:
+                continue
+            reused, changed = diff_ports(device.get("ports") if reuse else [], discovered["ports"])
+            if not reuse or any(p["status"] == "open" for p in changed):
+                to_detect[discovered["ip"]] = (device, discovered, reused, changed)
+            else:
+                yield _merge_detection(device, discovered, reused, changed, None, None)
+    except RuntimeError as e:
+        print(f"[!] Nmap port discovery error: {e}")
+
+    if not to_detect:
+        return
+    print(f"[+] Nmap: {len(to_detect)} host(s) need service/OS detection")
+    spec = _port_spec([p for _, _, _, changed in to_detect.values() for p in changed if p["status"] == "open"])
+    services = {}
+    if spec:
+        services = _collect(list(to_detect), f"{settings['service_arguments']} -p {spec}", "service detection")
+    try:
+        for os_scan in stream_nmap(list(to_detect), settings["os_arguments"]):
+            entry = to_detect.pop(os_scan["ip"], None)
+            if entry is not None:
+                yield _merge_detection(*entry, services.get(os_scan["ip"]), os_scan)
+    except RuntimeError as e:
+        print(f"[!] Nmap OS detection error: {e}")
+    # OS detection failed or missed a host: the other results still stand
+    for ip, entry in to_detect.items():
+        yield _merge_detection(*entry, services.get(ip), None)
+
+def enrich_device_with_nmap(device, reuse: bool = True):
+    """Enriches one device in place; see `enrich_devices_with_nmap`."""
+    for enriched in enrich_devices_with_nmap([device], reuse=reuse):
+        return enriched
+    return _apply_scan(device, None)
+
+def enrich_devices_with_nmap(devices: Iterable[dict], batch_size: int = None, reuse: bool = True) -> Iterator[dict]:
+    """
+    Enriches devices with nmap, `batch_size` targets per nmap run.
+
+    Each batch is scanned in tiers: a port discovery pass, then, only for
+    hosts with ports that are new or changed compared with the device's
+    stored `ports`, service detection on those ports and OS detection;
+    unchanged port mappings and the stored OS are reused. With
+    `reuse=False` every host gets full service and OS detection.
+    Devices are enriched in place and yielded as soon as nmap completes
+    them; hosts nmap found down (or a failed batch) are yielded last with
+    unknown values.
+    """
+    batch_size = batch_size or nmap_settings()["batch_size"]
+    devices = [d for d in devices if d.get("ip")]
+    for start in range(0, len(devices), batch_size):
+        pending = {d["ip"]: d for d in devices[start:start + batch_size]}
+        yield from _scan_tiered(pending, reuse)
+        for device in pending.values():
+            yield _apply_scan(device, None)
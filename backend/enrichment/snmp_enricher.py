@@ -1,42 +1,52 @@
-import subprocess
 import re
-from datetime import timedelta
 
+from backend.snmp.SNMPCapabilityCache import SNMPCapabilityCache
+from backend.snmp.SNMPClient import get_snmp_client
+from backend.snmp.SNMPTarget import SNMPTarget
+from backend.snmp.SNMPValue import SNMPValue
 from backend.utils.network_utils import run_snmpget_v2c, run_snmpget_v3
-from config.ConfigLoader import ConfigLoader
 
+SYS_DESCR_OID = "1.3.6.1.2.1.1.1.0"
+SYS_UPTIME_OID = "1.3.6.1.2.1.1.3.0"
+SYS_NAME_OID = "1.3.6.1.2.1.1.5.0"
+IF_IN_OCTETS_OID = "1.3.6.1.2.1.2.2.1.10"
+IF_OUT_OCTETS_OID = "1.3.6.1.2.1.2.2.1.16"
+IF_TABLE_LAST_CHANGE_OID = "1.3.6.1.2.1.31.1.5.0"
 
-def snmp_get_sysname_v2c(ip, community):
-    oid = "1.3.6.1.2.1.1.5.0"  # sysName.0
 
-    cmd = [
-        "snmpget",
-        "-v2c",
-        "-c", community,
-        ip,
-        oid
-    ]
+def _v2c_target(ip, community):
+    return SNMPTarget(ip, "v2c", community=community)
 
-    print("Running command:", " ".join(cmd))  # <-- Add this line
+def _v3_target(ip, username, auth_key, auth_protocol="SHA"):
+    return SNMPTarget(ip, "v3", username=username, auth_key=auth_key, auth_protocol=auth_protocol)
 
+def _get_value(target: SNMPTarget, oid: str) -> SNMPValue | None:
+    """Fetches a single OID, logging errors and returning None on failure."""
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=3)
-        if result.returncode == 0:
-            line = result.stdout.strip()
-            if "=" in line:
-                return line.split("=", 1)[-1].replace("STRING:", "").strip()
-            return line
-        else:
-            print(f"[SNMP error] {ip}: {result.stderr.strip()}")
+        value = get_snmp_client().get(target, [oid]).get(oid)
     except Exception as e:
-        print(f"[SNMP exception] {ip}: {e}")
+        print(f"[SNMP error] {target.ip}: {e}")
+        return None
+    if value is None or value.is_exception:
+        return None
+    return value
+
+def _software_from_sysdescr(sysdescr: str) -> str:
+    """Returns the text after 'Software:' in sysDescr, or the full sysDescr."""
+    sw_match = re.search(r'Software:\s*(.*)', sysdescr)
+    if sw_match:
+        return sw_match.group(1).strip()
+    return sysdescr.strip() or "Unknown"
 
-    return "Unknown"
+
+def snmp_get_sysname_v2c(ip, community):
+    """Get sysName.0 using SNMPv2c, or "Unknown" on error."""
+    value = _get_value(_v2c_target(ip, community), SYS_NAME_OID)
+    return str(value).strip() if value else "Unknown"
 
 def snmp_get_sysname_v3(ip, username, auth_key, auth_protocol="SHA"):
     """
-    Use net-snmp's CLI tool via subprocess to get sysName.0 from a device using SNMPv3.
-    Supports SNMPv3 with authNoPriv mode. Compatible with Python 3.12+.
+    Get sysName.0 from a device using SNMPv3 (authNoPriv).
 
     Parameters
     ----------
@@ -54,39 +64,12 @@ def snmp_get_sysname_v3(ip, username, auth_key, auth_protocol="SHA"):
     str
         The sysName string from the SNMP agent, or "Unknown" on error.
     """
-    oid = "1.3.6.1.2.1.1.5.0"  # sysName.0
-
-    cmd = [
-        "snmpget",
-        "-v3",
-        "-l", "authNoPriv",
-        "-u", username,
-        "-A", auth_key,
-        "-a", auth_protocol,
-        ip,
-        oid
-    ]
-
-    print("Running command:", " ".join(cmd))  # Debug output
-
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=3)
-        if result.returncode == 0:
-            line = result.stdout.strip()
-            if "=" in line:
-                return line.split("=", 1)[-1].replace("STRING:", "").strip()
-            return line
-        else:
-            print(f"[SNMP error] {ip}: {result.stderr.strip()}")
-    except Exception as e:
-        print(f"[SNMP exception] {ip}: {e}")
-
-    return "Unknown"
+    value = _get_value(_v3_target(ip, username, auth_key, auth_protocol), SYS_NAME_OID)
+    return str(value).strip() if value else "Unknown"
 
 def snmp_get_uptime_v2c(ip, community):
     """
-    Get sysUpTimeInstance via snmpget (v2c) and convert it to a timedelta.
-    Handles various uptime formats, including very small uptimes.
+    Get sysUpTimeInstance (v2c) as a timedelta.
 
     Parameters
     ----------
@@ -98,64 +81,14 @@ def snmp_get_uptime_v2c(ip, community):
     Returns
     -------
     timedelta or None
-        System uptime as timedelta, or None if error/unparseable.
+        System uptime as timedelta, or None if error.
     """
-    oid = "1.3.6.1.2.1.1.3.0"
-
-    cmd = [
-        "snmpget",
-        "-v2c",
-        "-c", community,
-        ip,
-        oid
-    ]
-
-    print("Running command:", " ".join(cmd))
-
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=3)
-        if result.returncode != 0:
-            print(f"[SNMP error] {ip}: {result.stderr.strip()}")
-            return None
-
-        line = result.stdout.strip()
-
-        # Try pattern with days:
-        m = re.search(r'(\d+)\s+day[s]?,\s*(\d+):(\d+):([\d.]+)', line)
-        if m:
-            days = int(m.group(1))
-            hours = int(m.group(2))
-            minutes = int(m.group(3))
-            seconds = float(m.group(4))
-            return timedelta(days=days, hours=hours, minutes=minutes, seconds=seconds)
-
-        # Try pattern with hours:minutes:seconds:
-        m = re.search(r'(\d+):(\d+):([\d.]+)', line)
-        if m:
-            hours = int(m.group(1))
-            minutes = int(m.group(2))
-            seconds = float(m.group(3))
-            return timedelta(hours=hours, minutes=minutes, seconds=seconds)
-
-        # Try pattern with only seconds (integer or float):
-        m = re.search(r'Timeticks: \((\d+)\)', line)
-        if m:
-            # Timeticks are in hundredths of a second, convert to seconds
-            timeticks = int(m.group(1))
-            seconds = timeticks / 100
-            return timedelta(seconds=seconds)
-
-        print(f"[Parse error] Unexpected format: {line}")
-
-    except Exception as e:
-        print(f"[SNMP exception] {ip}: {e}")
-
-    return None
+    value = _get_value(_v2c_target(ip, community), SYS_UPTIME_OID)
+    return value.as_timedelta() if value else None
 
 def snmp_get_uptime_v3(ip, user, auth_key):
     """
-    Get sysUpTimeInstance via snmpget (v3) and convert it to a timedelta.
-    Handles various uptime formats, including very small uptimes.
+    Get sysUpTimeInstance (v3) as a timedelta.
 
     Parameters
     ----------
@@ -169,61 +102,10 @@ def snmp_get_uptime_v3(ip, user, auth_key):
     Returns
     -------
     timedelta or None
-        System uptime as timedelta, or None if error/unparseable.
+        System uptime as timedelta, or None if error.
     """
-    oid = "1.3.6.1.2.1.1.3.0"
-
-    cmd = [
-        "snmpget",
-        "-v3",
-        "-l", "authNoPriv",
-        "-u", user,
-        "-A", auth_key,
-        "-a", "SHA",
-        ip,
-        oid
-    ]
-
-    print("Running command:", " ".join(cmd))
-
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=3)
-        if result.returncode != 0:
-            print(f"[SNMP error] {ip}: {result.stderr.strip()}")
-            return None
-
-        line = result.stdout.strip()
-
-        # Try pattern with days:
-        m = re.search(r'(\d+)\s+day[s]?,\s*(\d+):(\d+):([\d.]+)', line)
-        if m:
-            days = int(m.group(1))
-            hours = int(m.group(2))
-            minutes = int(m.group(3))
-            seconds = float(m.group(4))
-            return timedelta(days=days, hours=hours, minutes=minutes, seconds=seconds)
-
-        # Try pattern with hours:minutes:seconds:
-        m = re.search(r'(\d+):(\d+):([\d.]+)', line)
-        if m:
-            hours = int(m.group(1))
-            minutes = int(m.group(2))
-            seconds = float(m.group(3))
-            return timedelta(hours=hours, minutes=minutes, seconds=seconds)
-
-        # Try pattern with only timeticks (hundredths of seconds):
-        m = re.search(r'Timeticks: \((\d+)\)', line)
-        if m:
-            timeticks = int(m.group(1))
-            seconds = timeticks / 100
-            return timedelta(seconds=seconds)
-
-        print(f"[Parse error] Unexpected format: {line}")
-
-    except Exception as e:
-        print(f"[SNMP exception] {ip}: {e}")
-
-    return None
+    value = _get_value(_v3_target(ip, user, auth_key), SYS_UPTIME_OID)
+    return value.as_timedelta() if value else None
 
 def snmp_get_os_v2c(ip, community):
     """
@@ -241,43 +123,8 @@ def snmp_get_os_v2c(ip, community):
     str
         The string after 'Software:' in sysDescr, or 'Unknown' if not found.
     """
-    oid = "1.3.6.1.2.1.1.1.0"  # sysDescr
-
-    cmd = [
-        "snmpget",
-        "-v2c",
-        "-c", community,
-        ip,
-        oid
-    ]
-
-    print("Running command:", " ".join(cmd))
-
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=3)
-        if result.returncode == 0:
-            output = result.stdout.strip()
-
-            # Extract the content after 'STRING:'
-            match = re.search(r'STRING:\s*(.*)', output)
-            if match:
-                sysdescr = match.group(1)
-
-                # Extract content after 'Software:'
-                sw_match = re.search(r'Software:\s*(.*)', sysdescr)
-                if sw_match:
-                    return sw_match.group(1).strip()
-
-                # If no 'Software:' found, return full sysDescr
-                return sysdescr.strip()
-
-            return "Unknown"
-        else:
-            print(f"[SNMP error] {ip}: {result.stderr.strip()}")
-    except Exception as e:
-        print(f"[SNMP exception] {ip}: {e}")
-
-    return "Unknown"
+    value = _get_value(_v2c_target(ip, community), SYS_DESCR_OID)
+    return _software_from_sysdescr(str(value)) if value else "Unknown"
 
 def snmp_get_os_v3(ip, username, auth_key):
     """
@@ -297,45 +144,15 @@ def snmp_get_os_v3(ip, username, auth_key):
     str
         The string after 'Software:' in sysDescr, or 'Unknown' if not found.
     """
-    oid = "1.3.6.1.2.1.1.1.0"  # sysDescr
-
-    cmd = [
-        "snmpget",
-        "-v3",
-        "-l", "authNoPriv",
-        "-u", username,
-        "-A", auth_key,
-        "-a", "SHA",
-        ip,
-        oid
-    ]
-
-    print("Running command:", " ".join(cmd))
+    value = _get_value(_v3_target(ip, username, auth_key), SYS_DESCR_OID)
+    return _software_from_sysdescr(str(value)) if value else "Unknown"
 
+def _is_reachable(target: SNMPTarget) -> bool:
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=3)
-        if result.returncode == 0:
-            output = result.stdout.strip()
-
-            # Extract the content after 'STRING:'
-            match = re.search(r'STRING:\s*(.*)', output)
-            if match:
-                sysdescr = match.group(1)
-
-                # Extract content after 'Software:'
-                sw_match = re.search(r'Software:\s*(.*)', sysdescr)
-                if sw_match:
-                    return sw_match.group(1).strip()
-
-                return sysdescr.strip()
-
-            return "Unknown"
-        else:
-            print(f"[SNMP error] {ip}: {result.stderr.strip()}")
-    except Exception as e:
-        print(f"[SNMP exception] {ip}: {e}")
-
-    return "Unknown"
+        get_snmp_client().get(target, [SYS_UPTIME_OID])
+        return True
+    except Exception:
+        return False
 
 def snmp_get_status_v2c(ip, community):
     """
@@ -347,21 +164,7 @@ def snmp_get_status_v2c(ip, community):
     bool
         True if SNMP responds, False otherwise.
     """
-    oid = "1.3.6.1.2.1.1.3.0"  # sysUpTime
-
-    cmd = [
-        "snmpget",
-        "-v2c",
-        "-c", community,
-        ip,
-        oid
-    ]
-
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=3)
-        return result.returncode == 0
-    except Exception:
-        return False
+    return _is_reachable(_v2c_target(ip, community))
 
 def snmp_get_status_v3(ip, username, auth_key):
     """
@@ -381,116 +184,162 @@ def snmp_get_status_v3(ip, username, auth_key):
     bool
         True if the device responds to SNMPv3 query, False otherwise.
     """
-    oid = "1.3.6.1.2.1.1.3.0"  # sysUpTime OID
-
-    cmd = [
-        "snmpget",
-        "-v3",
-        "-l", "authNoPriv",
-        "-u", username,
-        "-A", auth_key,
-        "-a", "SHA",
-        ip,
-        oid
-    ]
+    return _is_reachable(_v3_target(ip, username, auth_key))
 
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=3)
-        return result.returncode == 0
-    except Exception:
-        return False
+def snmp_get_system_info(target: SNMPTarget) -> dict:
+    """
+    Fetches sysName, sysUpTime and sysDescr in a single GET request.
+
+    A successful answer doubles as the reachability probe, so enriching a
+    device costs one round-trip per SNMP version tried.
+
+    Parameters
+    ----------
+    target : SNMPTarget
+        Agent and credentials to query.
+
+    Returns
+    -------
+    dict
+        Keys 'hostname', 'uptime' (timedelta) and 'os'; values are None when
+        the agent does not expose the object.
+
+    Raises
+    ------
+    SNMPError
+        If the agent does not respond or rejects the request.
+    """
+    values = get_snmp_client().get_many(target, [SYS_NAME_OID, SYS_UPTIME_OID, SYS_DESCR_OID])
+
+    def present(oid):
+        value = values.get(oid)
+        return value if value is not None and not value.is_exception else None
+
+    sysname = present(SYS_NAME_OID)
+    uptime = present(SYS_UPTIME_OID)
+    sysdescr = present(SYS_DESCR_OID)
+
+    return {
+        "hostname": (str(sysname).strip() or None) if sysname else None,
+        "uptime": uptime.as_timedelta() if uptime and uptime.type == "Timeticks" else None,
+        "os": _software_from_sysdescr(str(sysdescr)) if sysdescr else None,
+    }
+
+def get_interface_sample(target: SNMPTarget, index: int) -> dict:
+    """
+    Reads the counters of one interface plus the values that tell whether the
+    cached ifIndex is still valid, all in a single GET request.
+
+    Returns
+    -------
+    dict
+        'in_octets' and 'out_octets' (int, or None if the index no longer
+        exists), 'if_table_last_change' (int or None if unsupported) and
+        'sys_uptime' (int timeticks or None).
+    """
+    in_oid = f'{IF_IN_OCTETS_OID}.{index}'
+    out_oid = f'{IF_OUT_OCTETS_OID}.{index}'
+    values = get_snmp_client().get_many(
+        target, [in_oid, out_oid, IF_TABLE_LAST_CHANGE_OID, SYS_UPTIME_OID]
+    )
+
+    def number(oid):
+        value = values.get(oid)
+        return int(value) if value is not None and value.type in SNMPValue.INTEGER_TYPES else None
+
+    return {
+        "in_octets": number(in_oid),
+        "out_octets": number(out_oid),
+        "if_table_last_change": number(IF_TABLE_LAST_CHANGE_OID),
+        "sys_uptime": number(SYS_UPTIME_OID),
+    }
 
 def get_in_octets_v2c(ip: str, index: int, community: str = 'public') -> int:
     """Retrieve ifInOctets for the given interface index."""
-    oid = f'1.3.6.1.2.1.2.2.1.10.{index}'
+    oid = f'{IF_IN_OCTETS_OID}.{index}'
     value = run_snmpget_v2c(ip, oid, community)
     return int(value)
 
 def get_out_octets_v2c(ip: str, index: int, community: str = 'public') -> int:
     """Retrieve ifOutOctets for the given interface index."""
-    oid = f'1.3.6.1.2.1.2.2.1.16.{index}'
+    oid = f'{IF_OUT_OCTETS_OID}.{index}'
     value = run_snmpget_v2c(ip, oid, community)
     return int(value)
 
 def get_in_octets_v3(ip: str, index: int, username: str, auth_key: str, auth_protocol: str = "SHA") -> int:
-    oid = f'1.3.6.1.2.1.2.2.1.10.{index}'
+    oid = f'{IF_IN_OCTETS_OID}.{index}'
     return int(run_snmpget_v3(ip, oid, username, auth_key, auth_protocol))
 
 def get_out_octets_v3(ip: str, index: int, username: str, auth_key: str, auth_protocol: str = "SHA") -> int:
-    oid = f'1.3.6.1.2.1.2.2.1.16.{index}'
+    oid = f'{IF_OUT_OCTETS_OID}.{index}'
     return int(run_snmpget_v3(ip, oid, username, auth_key, auth_protocol))
 
-def detect_snmp_version(ip: str) -> str | None:
-    """Determine SNMP version supported by device."""
-    config = ConfigLoader()
-    v3 = config.get("snmp_v3", {})
-    username = v3.get("username", "admin")
-    auth_key = v3.get("auth_key", "admin123")
-    auth_protocol = v3.get("auth_protocol", "SHA")
-
-    test_oid = '1.3.6.1.2.1.1.1.0'  # sysDescr
-
-    try:
-        run_snmpget_v3(ip, test_oid, username, auth_key, auth_protocol)
-        return "v3"
-    except Exception:
-        pass
-
-    try:
-        run_snmpget_v2c(ip, test_oid)
-        return "v2c"
-    except Exception:
-        pass
+def detect_snmp_version(ip: str, mac: str = None, force: bool = False) -> str | None:
+    """
+    Determine SNMP version supported by device.
 
+    Results, including "no SNMP", are served from `SNMPCapabilityCache` until
+    their TTL expires; `force=True` re-probes the host.
+    """
+    if not force:
+        cached = SNMPCapabilityCache.get(ip, mac)
+        if cached is not None:
+            return cached["version"]
+
+    errors = []
+    for version in ("v3", "v2c"):
+        try:
+            get_snmp_client().get(SNMPTarget.from_config(ip, version), [SYS_DESCR_OID])
+        except Exception as e:
+            errors.append(f"{version}: {e}")
+            continue
+        SNMPCapabilityCache.store(ip, mac, version)
+        return version
+
+    SNMPCapabilityCache.store(ip, mac, None, error="; ".join(errors))
     return None
 
 
 def enrich_device_with_snmp(device):
     ip = device.get("ip")
-    community = "public"
-
-    config = ConfigLoader()
-    v3_config = config.get("snmp_v3", {})
-    user = v3_config.get("username", "admin")
-    auth_key = v3_config.get("auth_key", "admin123")
-    auth_protocol = v3_config.get("auth_protocol", "SHA")
-
-    sysname = None
-    uptime = None
-    os = None
-    snmp_detected = False
-
-    # Check SNMPv3
-    if snmp_get_status_v3(ip, user, auth_key):
-        print(f"[+] SNMPv3 supported on {ip}")
-        sysname = snmp_get_sysname_v3(ip, user, auth_key, auth_protocol)
-        uptime = snmp_get_uptime_v3(ip, user, auth_key)
-        os = snmp_get_os_v3(ip, user, auth_key)
-        device["snmp_version"] = "v3"
-        snmp_detected = True
-
-    # Check SNMPv2c if v3 failed or incomplete
-    elif snmp_get_status_v2c(ip, community):
-        print(f"[+] SNMPv2c supported on {ip}")
-        sysname = snmp_get_sysname_v2c(ip, community)
-        uptime = snmp_get_uptime_v2c(ip, community)
-        os = snmp_get_os_v2c(ip, community)
-        device["snmp_version"] = "v2c"
-        snmp_detected = True
-
-    else:
+
+    mac = device.get("mac")
+
+    # Try the cached / previously seen version first; v3 before v2c otherwise
+    versions = ["v3", "v2c"]
+    cached = SNMPCapabilityCache.get(ip, mac)
+    known = cached["version"] if cached else device.get("snmp_version")
+    if known in versions:
+        versions.remove(known)
+        versions.insert(0, known)
+
+    info = None
+    errors = []
+    for version in versions:
+        try:
+            info = snmp_get_system_info(SNMPTarget.from_config(ip, version))
+        except Exception as e:
+            errors.append(f"{version}: {e}")
+            continue
+        print(f"[+] SNMP{version} supported on {ip}")
+        device["snmp_version"] = version
+        SNMPCapabilityCache.store(ip, mac, version)
+        break
+
+    if info is None:
         print(f"[!] No SNMP support detected on {ip}")
+        SNMPCapabilityCache.store(ip, mac, None, error="; ".join(errors))
         device["snmp_version"] = None
         device["device_status"] = False
         return device
 
     # Update fields if detected
-    if sysname:
-        device["hostname"] = sysname
-    if uptime:
-        device["device_uptime"] = int(uptime.total_seconds())
-    if os:
-        device["os"] = os
-
-    device["device_status"] = snmp_detected
+    if info["hostname"]:
+        device["hostname"] = info["hostname"]
+    if info["uptime"]:
+        device["device_uptime"] = int(info["uptime"].total_seconds())
+    if info["os"]:
+        device["os"] = info["os"]
+
+    device["device_status"] = True
     return device
@@ -1,8 +1,27 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from backend.api.device_controller import router as device_router
+from backend.enrichment.EnrichmentCache import EnrichmentCache
+from backend.services.BandwidthPoller import BandwidthPoller
+from backend.services.NeighborService import NeighborService
+from backend.services.PassiveDiscoveryService import PassiveDiscoveryService
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    BandwidthPoller.start()
+    PassiveDiscoveryService.start()
+    NeighborService.start()
+    yield
+    NeighborService.stop()
+    PassiveDiscoveryService.stop()
+    BandwidthPoller.stop()
+    EnrichmentCache.flush()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Allow frontend (adjust origin in prod)
 app.add_middleware(
@@ -10,6 +29,7 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 # Mount the device API
@@ -0,0 +1,221 @@
+import threading
+import uuid
+from typing import Iterable
+
+
+class DeviceStore:
+    """
+    Thread-safe, versioned in-memory store of device dicts.
+
+    Devices are kept by id, with unique indexes by IP and MAC and secondary
+    indexes by type and tag, so every lookup is O(1). A write that would
+    give two devices the same IP is rejected; callers decide which device
+    keeps the address.
+
+    The store is copy-on-write: every write builds a new `Snapshot` under
+    the writer lock and publishes it with a single reference swap, bumping
+    the version by one. Versions restart at 0 with every store, so clients
+    get them as a `token` that also names the store's random `epoch`. Reads take no lock; they use whichever snapshot is
+    current, which never changes after publication. Stored device dicts are
+    copies and must be treated as read-only; to change a device, `update` it
+    with a new dict. Writers can hold `store.lock` to make a
+    read-modify-write sequence atomic.
+    """
+
+    class Snapshot:
+        """An immutable view of the store at one version."""
+
+        __slots__ = ("epoch", "version", "by_id", "id_by_ip", "id_by_mac", "ids_by_type", "ids_by_tag")
+
+        def __init__(self, epoch="", version=0, by_id=None, id_by_ip=None, id_by_mac=None, ids_by_type=None,
+                     ids_by_tag=None):
+            self.epoch = epoch
+            self.version = version
+            self.by_id = by_id or {}
+            self.id_by_ip = id_by_ip or {}
+            self.id_by_mac = id_by_mac or {}
+            self.ids_by_type = ids_by_type or {}
+            self.ids_by_tag = ids_by_tag or {}
+
+        @property
+        def token(self) -> str:
+            """'<epoch>-<version>'; never repeats across stores, unlike the bare version."""
+            return f"{self.epoch}-{self.version}"
+
+        def devices(self) -> list[dict]:
+            return list(self.by_id.values())
+
+        def by_type(self, type_name: str) -> list[dict]:
+            return [self.by_id[i] for i in self.ids_by_type.get(type_name, ())]
+
+        def by_tag(self, tag: str) -> list[dict]:
+            return [self.by_id[i] for i in self.ids_by_tag.get(tag, ())]
+
+        def _next(self) -> "DeviceStore.Snapshot":
+            # Shallow copies; index sets are copied when touched (see DeviceStore._index)
+            return DeviceStore.Snapshot(
+                self.epoch, self.version + 1, dict(self.by_id), dict(self.id_by_ip), dict(self.id_by_mac),
+                dict(self.ids_by_type), dict(self.ids_by_tag),
+            )
+
+    def __init__(self, devices: Iterable[dict] = ()):
+        self.lock = threading.RLock()
+        self._snapshot = DeviceStore.Snapshot(uuid.uuid4().hex[:12])
+        if devices:
+            self.replace_all(devices)
+
+    @staticmethod
+    def _mac_key(mac: str | None) -> str:
+        return (mac or "").lower().replace("-", ":")
+
+    @staticmethod
+    def _index(state: "DeviceStore.Snapshot", device: dict) -> None:
+        device_id = device["id"]
+        if device.get("ip"):
+            holder = state.id_by_ip.get(device["ip"])
+            if holder is not None and holder != device_id:
+                raise ValueError(f"IP {device['ip']} is already held by device {holder}.")
+            state.id_by_ip[device["ip"]] = device_id
+        state.by_id[device_id] = device
+        if device.get("mac"):
+            state.id_by_mac[DeviceStore._mac_key(device["mac"])] = device_id
+        for index, keys in ((state.ids_by_type, [device.get("type", "LANDevice")]),
+                            (state.ids_by_tag, device.get("tags") or [])):
+            for key in keys:
+                index[key] = index.get(key, frozenset()) | {device_id}
+
+    @staticmethod
+    def _unindex(state: "DeviceStore.Snapshot", device: dict, keep_slot: bool = False) -> None:
+        device_id = device["id"]
+        if not keep_slot:
+            state.by_id.pop(device_id, None)
+        if state.id_by_ip.get(device.get("ip")) == device_id:
+            del state.id_by_ip[device["ip"]]
+        mac = DeviceStore._mac_key(device.get("mac"))
+        if state.id_by_mac.get(mac) == device_id:
+            del state.id_by_mac[mac]
+        for index, keys in ((state.ids_by_type, [device.get("type", "LANDevice")]),
+                            (state.ids_by_tag, device.get("tags") or [])):
+            for key in keys:
+                ids = index.get(key, frozenset()) - {device_id}
+                if ids:
+                    index[key] = ids
+                else:
+                    index.pop(key, None)
+
+    def snapshot(self) -> "DeviceStore.Snapshot":
+        """The current immutable snapshot; never blocks."""
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def replace_all(self, devices: Iterable[dict]) -> None:
+        """
+        Replaces the whole content of the store.
+
+        Devices without an id are given a new one.
+
+        Raises:
+            ValueError: If two devices have the same IP; the store is left unchanged.
+        """
+        with self.lock:
+            state = DeviceStore.Snapshot(self._snapshot.epoch, self._snapshot.version + 1)
+            for device in devices:
+                device = dict(device)
+                if not device.get("id"):
+                    device["id"] = str(uuid.uuid4())
+                self._index(state, device)
+            self._snapshot = state
+
+    def all(self) -> list[dict]:
+        return self._snapshot.devices()
+
+    def get(self, device_id: str) -> dict | None:
+        return self._snapshot.by_id.get(device_id)
+
+    def get_by_ip(self, ip: str) -> dict | None:
+        state = self._snapshot
+        return state.by_id.get(state.id_by_ip.get(ip))
+
+    def get_by_mac(self, mac: str) -> dict | None:
+        state = self._snapshot
+        return state.by_id.get(state.id_by_mac.get(self._mac_key(mac)))
+
+    def add(self, device: dict) -> None:
+        """
+        Adds a new device.
+
+        Raises:
+            ValueError: If a device with the same id or IP already exists.
+        """
+        with self.lock:
+            if device["id"] in self._snapshot.by_id:
+                raise ValueError(f"Device with id {device['id']} already exists.")
+            state = self._snapshot._next()
+            self._index(state, dict(device))
+            self._snapshot = state
+
+    def update(self, device: dict) -> dict | None:
+        """
+        Replaces the stored device with the same id, or else the same IP.
+
+        Args:
+            device (dict): The new device state.
+
+        Returns:
+            dict | None: The replaced device, or None if nothing matched.
+
+        Raises:
+            ValueError: If another device holds the new IP.
+        """
+        with self.lock:
+            existing = self.get(device.get("id")) or self.get_by_ip(device.get("ip"))
+            if existing is None:
+                return None
+            device = dict(device)
+            if not device.get("id"):
+                device["id"] = existing["id"]
+            state = self._snapshot._next()
+            # Replacing a device under the same id keeps its position in `all()`
+            self._unindex(state, existing, keep_slot=existing["id"] == device["id"])
+            self._index(state, device)
+            self._snapshot = state
+            return existing
+
+    def apply(self, put: Iterable[dict] = (), remove: Iterable[str] = ()) -> None:
+        """
+        Removes the `remove` ids, then adds or replaces (by id) the `put`
+        devices, as one write with a single version bump.
+
+        Raises:
+            ValueError: If two devices would end up with the same IP; nothing is written.
+        """
+        with self.lock:
+            state = self._snapshot._next()
+            for device_id in remove:
+                existing = state.by_id.get(device_id)
+                if existing is not None:
+                    self._unindex(state, existing)
+            put = [dict(device) for device in put]
+            # Unindex every replaced device first, so devices can swap addresses within one write
+            for device in put:
+                existing = state.by_id.get(device["id"])
+                if existing is not None:
+                    self._unindex(state, existing, keep_slot=True)
+            for device in put:
+                self._index(state, device)
+            self._snapshot = state
+
+    def remove(self, device_id: str) -> dict | None:
+        with self.lock:
+            existing = self.get(device_id)
+            if existing is not None:
+                state = self._snapshot._next()
+                self._unindex(state, existing)
+                self._snapshot = state
+            return existing
+
+    def __len__(self) -> int:
+        return len(self._snapshot.by_id)
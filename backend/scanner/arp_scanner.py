@@ -1,26 +1,147 @@
+import ipaddress
+import queue
+import threading
+import time
+
+from scapy.config import conf
 from scapy.layers.l2 import Ether, ARP
-from scapy.sendrecv import srp
+from scapy.sendrecv import AsyncSniffer, sendp
 
 from backend.utils.network_utils import get_local_ip, get_netmask_for_ip, get_cidr_from_ip
+from config.ConfigLoader import ConfigLoader
+
+DEFAULT_ARP_SETTINGS = {
+    "iface": None,          # None: pick the interface routing to the scanned subnet
+    "rate": 500,            # packets per second
+    "retries": 1,           # extra passes over hosts that did not answer
+    "chunk_size": 256,      # hosts per burst
+    "chunk_timeout": 1.0,   # seconds to wait for replies after each burst
+}
+
+
+def _arp_settings(**overrides) -> dict:
+    settings = dict(DEFAULT_ARP_SETTINGS)
+    settings.update(ConfigLoader().get("arp", {}))
+    settings.update({k: v for k, v in overrides.items() if v is not None})
+    return settings
+
+
+def _default_range() -> str:
+    local_ip = get_local_ip()
+    netmask = get_netmask_for_ip(local_ip)
+    return get_cidr_from_ip(local_ip, netmask)
+
+
+def _iface_for(network: ipaddress.IPv4Network) -> str:
+    return conf.route.route(str(network.network_address))[0]
+
+
+def _chunks(hosts, size):
+    chunk = []
+    for host in hosts:
+        chunk.append(host)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def arp_sweep(ip_range=None, iface=None, rate=None, retries=None, chunk_size=None, chunk_timeout=None, hosts=None,
+              stop=None):
+    """
+    Streams ARP replies for a subnet, or for an explicit `hosts` list, as they arrive.
+
+    Hosts are probed in chunks of `chunk_size`, paced at `rate` packets per
+    second, and each chunk is followed by a wait of up to `chunk_timeout`
+    seconds. A background sniffer collects replies the whole time, so hosts
+    answering late are still reported. Hosts that stay silent get up to
+    `retries` extra passes. Unset arguments come from the `arp` section of
+    config.json. Setting the optional `stop` event ends the sweep after the
+    current chunk.
+
+    Yields:
+        dict: {'ip': ..., 'mac': ...} once per responding host.
+    """
+    settings = _arp_settings(
+        iface=iface, rate=rate, retries=retries, chunk_size=chunk_size, chunk_timeout=chunk_timeout
+    )
+    if hosts is not None:
+        hosts = [str(h) for h in hosts]
+        if not hosts:
+            return
+        wanted = set(hosts)
+        all_targets = lambda: iter(hosts)
+        accepts = wanted.__contains__
+        label = f"{len(hosts)} hosts"
+        iface = settings["iface"] or _iface_for(ipaddress.ip_network(hosts[0]))
+    else:
+        network = ipaddress.ip_network(ip_range or _default_range(), strict=False)
+        all_targets = lambda: (str(h) for h in network.hosts())
+        accepts = lambda ip: ipaddress.ip_address(ip) in network
+        label = str(network)
+        iface = settings["iface"] or _iface_for(network)
+    inter = 1.0 / settings["rate"] if settings["rate"] else 0
+
+    print(f"[+] ARP sweep on {label} via {iface}")
+
+    replies = queue.Queue()
+    started = threading.Event()
+    abandoned = threading.Event()
+
+    def on_started():
+        started.set()
+        if abandoned.is_set():
+            # Started after the sweep gave up waiting; nobody would ever stop it
+            sniffer.stop(join=False)
+
+    sniffer = AsyncSniffer(
+        iface=iface,
+        filter="arp and arp[6:2] = 2",
+        prn=lambda p: replies.put((p[ARP].psrc, p[ARP].hwsrc)),
+        store=False,
+        started_callback=on_started,
+    )
+    sniffer.start()
+    # Do not send anything before the capture socket is open
+    if not started.wait(2) or sniffer.exception:
+        abandoned.set()
+        if started.is_set() and sniffer.running:
+            try:
+                sniffer.stop()
+            except Exception:
+                pass  # already stopped by on_started
+        raise RuntimeError(f"ARP listener could not start on {iface}: {sniffer.exception}")
+
+    seen = set()
+
+    def collect(wait):
+        deadline = time.monotonic() + wait
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                ip, mac = replies.get(timeout=max(0, remaining)) if remaining > 0 else replies.get_nowait()
+            except queue.Empty:
+                return
+            if ip not in seen and accepts(ip):
+                seen.add(ip)
+                yield {'ip': ip, 'mac': mac}
+
+    try:
+        for attempt in range(settings["retries"] + 1):
+            targets = (h for h in all_targets() if h not in seen)
+            for chunk in _chunks(targets, settings["chunk_size"]):
+                if stop is not None and stop.is_set():
+                    return
+                packets = [Ether(dst="ff:ff:ff:ff:ff:ff") / ARP(pdst=ip) for ip in chunk]
+                sendp(packets, iface=iface, inter=inter, verbose=0)
+                yield from collect(settings["chunk_timeout"])
+        yield from collect(0)
+    finally:
+        if sniffer.running:
+            sniffer.stop()
 
 
-def arp_scan(ip_range=None):
+def arp_scan(ip_range=None, iface=None):
     """Performs ARP scan and returns a list of dicts with 'ip' and 'mac' only."""
-    if ip_range is None:
-        local_ip = get_local_ip()
-        netmask = get_netmask_for_ip(local_ip)
-        ip_range = get_cidr_from_ip(local_ip, netmask)
-
-    print(f"[+] Scanning ARP on {ip_range}")
-    packet = Ether(dst="ff:ff:ff:ff:ff:ff") / ARP(pdst=ip_range)
-    result = srp(packet,iface="en6",   timeout=5, verbose=0)[0]
-
-    devices = []
-    for _, received in result:
-        device = {
-            'ip': received.psrc,
-            'mac': received.hwsrc
-        }
-        devices.append(device)
-
-    return devices
+    return list(arp_sweep(ip_range, iface=iface))
@@ -0,0 +1,120 @@
+import socket
+
+try:
+    from pyroute2 import IPRoute
+except ImportError:
+    IPRoute = None
+
+PROC_NET_ARP = "/proc/net/arp"
+
+# /proc/net/arp flags (include/uapi/linux/if_arp.h)
+ATF_COM = 0x02
+ATF_PERM = 0x04
+
+# Neighbor states (include/uapi/linux/neighbour.h)
+NUD_STATES = {
+    0x01: "incomplete",
+    0x02: "reachable",
+    0x04: "stale",
+    0x08: "delay",
+    0x10: "probe",
+    0x20: "failed",
+    0x40: "noarp",
+    0x80: "permanent",
+}
+
+# States in which the host recently answered (or is configured statically)
+ALIVE_STATES = {"reachable", "delay", "probe", "permanent"}
+# The kernel still holds a hardware address but has not heard from the host lately;
+# /proc/net/arp reports every resolved entry this way
+UNCONFIRMED_STATES = {"stale", "complete"}
+DEAD_STATES = {"incomplete", "failed"}
+
+
+def _read_proc(path: str) -> list[dict]:
+    entries = []
+    with open(path) as f:
+        next(f, None)  # header
+        for line in f:
+            fields = line.split()
+            if len(fields) < 6:
+                continue
+            ip, _, flags, mac, _, iface = fields[:6]
+            flags = int(flags, 16)
+            if flags & ATF_PERM:
+                state = "permanent"
+            elif flags & ATF_COM:
+                # /proc does not expose the NUD state, only "resolved or not"
+                state = "complete"
+            else:
+                state = "incomplete"
+            entries.append({"ip": ip, "mac": mac.lower(), "iface": iface, "state": state})
+    return entries
+
+
+def _read_netlink() -> list[dict]:
+    entries = []
+    with IPRoute() as ipr:
+        links = {link["index"]: link.get_attr("IFLA_IFNAME") for link in ipr.get_links()}
+        for neighbor in ipr.get_neighbours(family=socket.AF_INET):
+            ip = neighbor.get_attr("NDA_DST")
+            if not ip:
+                continue
+            entries.append({
+                "ip": ip,
+                "mac": (neighbor.get_attr("NDA_LLADDR") or "00:00:00:00:00:00").lower(),
+                "iface": links.get(neighbor["ifindex"]),
+                "state": NUD_STATES.get(neighbor["state"], "none"),
+            })
+    return entries
+
+
+def read_neighbor_table(path: str = PROC_NET_ARP) -> list[dict]:
+    """
+    Reads the kernel's IPv4 neighbor (ARP) table in one pass, without sending packets.
+
+    Uses netlink through pyroute2 (see requirements.txt), which reports the
+    precise NUD state; without it, parses `/proc/net/arp`, where resolved
+    entries are reported as 'complete' and prove nothing about liveness,
+    so callers have to confirm them with a ping.
+
+    Returns:
+        list[dict]: {'ip', 'mac', 'iface', 'state'} per neighbor entry.
+    """
+    if IPRoute is not None:
+        try:
+            return _read_netlink()
+        except Exception as e:
+            print(f"[!] Netlink neighbor dump failed, falling back to {path}: {e}")
+    return _read_proc(path)
+
+
+def _has_mac(entry: dict) -> bool:
+    return entry["mac"] != "00:00:00:00:00:00"
+
+
+def is_alive(entry: dict) -> bool:
+    return entry["state"] in ALIVE_STATES and _has_mac(entry)
+
+
+def is_unconfirmed(entry: dict) -> bool:
+    return entry["state"] in UNCONFIRMED_STATES and _has_mac(entry)
+
+
+def neighbor_is_alive(ip: str) -> bool | None:
+    """
+    Liveness of `ip` per the neighbor table.
+
+    Returns:
+        bool | None: None if the table cannot tell, i.e. the kernel has no
+        entry for `ip` or only a stale one; callers should probe the host.
+    """
+    try:
+        entries = [e for e in read_neighbor_table() if e["ip"] == ip]
+    except OSError:
+        return None  # no neighbor table on this platform
+    if any(is_alive(e) for e in entries):
+        return True
+    if entries and all(e["state"] in DEAD_STATES for e in entries):
+        return False
+    return None
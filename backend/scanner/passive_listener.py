@@ -0,0 +1,91 @@
+import threading
+
+from scapy.layers.dhcp import BOOTP, DHCP
+from scapy.layers.l2 import ARP
+from scapy.sendrecv import AsyncSniffer
+
+PASSIVE_FILTER = "arp or (udp and (port 67 or port 68))"
+
+DHCP_REQUEST = 3
+DHCP_ACK = 5
+
+
+def _dhcp_options(packet) -> dict:
+    options = {}
+    for option in packet[DHCP].options:
+        if isinstance(option, tuple) and len(option) >= 2:
+            options[option[0]] = option[1]
+    return options
+
+
+def _format_mac(raw: bytes) -> str:
+    return ":".join(f"{b:02x}" for b in raw[:6])
+
+
+def observation_from_packet(packet) -> dict | None:
+    """
+    Extracts a host sighting from an ARP or DHCP packet.
+
+    Returns a dict with 'ip', 'mac', 'source' ('arp' or 'dhcp') and, for
+    DHCP, an optional 'hostname'; None if the packet says nothing useful.
+    """
+    if ARP in packet:
+        arp = packet[ARP]
+        # 0.0.0.0 senders are address-conflict probes, not configured hosts
+        if arp.op in (1, 2) and arp.psrc and arp.psrc != "0.0.0.0":
+            return {"ip": arp.psrc, "mac": arp.hwsrc, "source": "arp"}
+        return None
+
+    if BOOTP in packet and DHCP in packet:
+        options = _dhcp_options(packet)
+        message_type = options.get("message-type")
+        if message_type == DHCP_ACK:
+            ip = packet[BOOTP].yiaddr
+        elif message_type == DHCP_REQUEST:
+            ip = options.get("requested_addr") or packet[BOOTP].ciaddr
+        else:
+            return None
+        if not ip or ip == "0.0.0.0":
+            return None
+
+        hostname = options.get("hostname")
+        if isinstance(hostname, bytes):
+            hostname = hostname.decode("utf-8", errors="ignore")
+
+        return {
+            "ip": ip,
+            "mac": _format_mac(packet[BOOTP].chaddr),
+            "source": "dhcp",
+            "hostname": hostname or None,
+        }
+
+    return None
+
+
+def start_passive_listener(callback, iface=None) -> AsyncSniffer:
+    """
+    Starts a background sniffer passing every ARP/DHCP sighting to `callback`.
+
+    The BPF filter keeps all other traffic in the kernel. Raises RuntimeError
+    if the capture cannot be opened (missing privileges or libpcap).
+    """
+    def handle(packet):
+        try:
+            observation = observation_from_packet(packet)
+            if observation:
+                callback(observation)
+        except Exception as e:
+            print(f"[!] Passive listener failed to process packet: {e}")
+
+    started = threading.Event()
+    sniffer = AsyncSniffer(
+        iface=iface,
+        filter=PASSIVE_FILTER,
+        prn=handle,
+        store=False,
+        started_callback=started.set,
+    )
+    sniffer.start()
+    if not started.wait(2) or sniffer.exception:
+        raise RuntimeError(f"Passive listener could not start on {iface or 'default interface'}: {sniffer.exception}")
+    return sniffer
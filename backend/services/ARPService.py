@@ -2,27 +2,40 @@ import uuid
 from datetime import timedelta
 
 from backend.domain.LANDevice import LANDevice
-from backend.enrichment.snmp_enricher import detect_snmp_version
+from backend.enrichment.EnrichmentCache import EnrichmentCache
+from backend.utils.OUIDatabase import get_oui_database
 
 
 class ARPService:
 
     @staticmethod
-    def create_lan_device_from_arp(ip: str, mac: str) -> LANDevice:
-        snmp_version = detect_snmp_version(ip)
+    def create_lan_device_from_arp(ip: str, mac: str, snmp_version: str = None) -> LANDevice:
+        """
+        Builds a LANDevice from an ARP reply.
 
+        No probing happens here; the SNMP capability is detected once per host
+        by the discovery probe stage and passed in. The vendor comes from the
+        local OUI index, which needs no network access. Hostname, OS, ports
+        and uptime are filled in from the enrichment cache when it holds fresh
+        results for this MAC, e.g. from before a restart.
+        """
+        cached = EnrichmentCache.fields_for(mac)
+        vendor = cached.get("vendor")
+        if not vendor:
+            database = get_oui_database()
+            vendor = database.lookup(mac) if database else None
         return LANDevice(
             id=str(uuid.uuid4()),
             ip=ip,
             mac=mac,
-            vendor="Unknown",
-            os="Unknown",
+            vendor=vendor or "Unknown",
+            os=cached.get("os", "Unknown"),
             tags=[],
-            ports=[],
+            ports=cached.get("ports", []),
             device_status=True,
-            device_uptime=timedelta(seconds=0),
+            device_uptime=timedelta(seconds=float(cached.get("device_uptime", 0))),
             snmp_version=snmp_version,
-            hostname="Unknown"
+            hostname=cached.get("hostname", "Unknown")
         )
 
     @staticmethod
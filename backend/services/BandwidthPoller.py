@@ -0,0 +1,178 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from backend.services.BandwidthService import BandwidthService
+from backend.services.DeviceService import DeviceService
+from backend.services.EventBus import EventBus
+from backend.utils.RingBuffer import RingBuffer
+from config.ConfigLoader import ConfigLoader
+
+
+class BandwidthPoller:
+    """
+    Samples interface counters of every SNMP-capable device on a fixed schedule.
+
+    Rates are written into one `RingBuffer` per (ip, mac). HTTP handlers only
+    read these buffers, so SNMP load no longer depends on how many clients
+    are watching. Reads run on one thread pool kept for the poller's
+    lifetime, so each worker builds its SNMP engine once rather than every
+    cycle.
+
+    Only online devices are polled. A cycle waits at most half the interval
+    for its reads; a slower read is collected by a later cycle, and the
+    device is not read again until it finishes. A device whose read fails
+    is retried after an exponential backoff capped at `max_backoff`
+    seconds. Configured in config.json:
+
+        "bandwidth": {"poll_interval": 1.0, "history": 300, "workers": 16, "max_backoff": 60}
+    """
+
+    _buffers = {}
+    _buffers_lock = threading.Lock()
+    _thread = None
+    _stop = threading.Event()
+    _pool = None
+    _pool_lock = threading.Lock()
+    # Owned by the poller thread: (ip, mac) -> future of the running read
+    _in_flight = {}
+    # (ip, mac) -> (consecutive failures, monotonic time of the next attempt)
+    _failures = {}
+
+    @classmethod
+    def _settings(cls) -> dict:
+        conf = ConfigLoader().get("bandwidth", {})
+        return {
+            "poll_interval": float(conf.get("poll_interval", 1.0)),
+            "history": int(conf.get("history", 300)),
+            "workers": int(conf.get("workers", 16)),
+            "max_backoff": float(conf.get("max_backoff", 60)),
+        }
+
+    @classmethod
+    def _buffer(cls, ip: str, mac: str, capacity: int) -> RingBuffer:
+        key = (ip, mac)
+        with cls._buffers_lock:
+            buffer = cls._buffers.get(key)
+            if buffer is None:
+                buffer = cls._buffers[key] = RingBuffer(capacity)
+            return buffer
+
+    @classmethod
+    def _pollable_devices(cls) -> list[dict]:
+        return [
+            d for d in DeviceService.get_devices()
+            if d.get("device_status") and d.get("snmp_version") in ("v2c", "v3") and d.get("mac")
+        ]
+
+    @classmethod
+    def _executor(cls, workers: int) -> ThreadPoolExecutor:
+        with cls._pool_lock:
+            if cls._pool is None:
+                cls._pool = ThreadPoolExecutor(max(1, workers), thread_name_prefix="bandwidth")
+            return cls._pool
+
+    @classmethod
+    def _submit_due(cls, pool: ThreadPoolExecutor) -> list:
+        """Starts a read for every online device that has none running and is not backing off."""
+        now = time.monotonic()
+        started = []
+        for device in cls._pollable_devices():
+            key = (device["ip"], device["mac"])
+            if key in cls._in_flight or cls._failures.get(key, (0, 0.0))[1] > now:
+                continue
+            cls._in_flight[key] = pool.submit(
+                BandwidthService.read_counters, device["ip"], device["mac"], device["snmp_version"]
+            )
+            started.append(cls._in_flight[key])
+        return started
+
+    @classmethod
+    def _collect(cls, settings: dict) -> list[dict]:
+        """Readings of the finished reads; failed ones are backed off."""
+        readings = []
+        for key, future in list(cls._in_flight.items()):
+            if not future.done():
+                continue
+            del cls._in_flight[key]
+            try:
+                readings.append(future.result())
+                cls._failures.pop(key, None)
+            except Exception as e:
+                failures = cls._failures.get(key, (0, 0.0))[0] + 1
+                delay = min(settings["poll_interval"] * 2 ** failures, settings["max_backoff"])
+                cls._failures[key] = (failures, time.monotonic() + delay)
+                print(f"[Bandwidth Error] {key[0]}: {e} (retrying in {delay:.0f}s)")
+        return readings
+
+    @classmethod
+    def poll_once(cls, settings: dict = None) -> None:
+        """Runs one polling cycle: starts the due reads and collects what finished in time."""
+        settings = settings or cls._settings()
+        now = time.time()
+        started = cls._submit_due(cls._executor(settings["workers"]))
+        # Reads still running from earlier cycles are collected when they finish, never waited on
+        wait(started, timeout=settings["poll_interval"] / 2)
+        rates = BandwidthService.apply_rates(cls._collect(settings))
+        for r in rates:
+            cls._buffer(r["ip"], r["mac"], settings["history"]).append(now, r["in_kbps"], r["out_kbps"])
+        if rates:
+            EventBus.publish("bandwidth", {"time": now, "devices": rates})
+
+    @classmethod
+    def _run(cls):
+        settings = cls._settings()
+        interval = settings["poll_interval"]
+        next_run = time.monotonic()
+        while not cls._stop.is_set():
+            cls.poll_once(settings)
+            next_run += interval
+            delay = next_run - time.monotonic()
+            if delay < 0:
+                # A slow cycle overran the schedule; skip the missed ticks
+                next_run = time.monotonic()
+                delay = 0
+            cls._stop.wait(delay)
+
+    @classmethod
+    def start(cls) -> None:
+        if cls._thread and cls._thread.is_alive():
+            return
+        cls._stop.clear()
+        cls._thread = threading.Thread(target=cls._run, name="bandwidth-poller", daemon=True)
+        cls._thread.start()
+        print("[+] Bandwidth poller started")
+
+    @classmethod
+    def stop(cls) -> None:
+        cls._stop.set()
+        if cls._thread:
+            cls._thread.join(timeout=5)
+            cls._thread = None
+        with cls._pool_lock:
+            if cls._pool:
+                cls._pool.shutdown(wait=False, cancel_futures=True)
+                cls._pool = None
+        cls._in_flight.clear()
+
+    @classmethod
+    def latest(cls, ip: str, mac: str) -> dict:
+        """Newest rates for a device; zeros until the poller has sampled it."""
+        buffer = cls._buffers.get((ip, mac))
+        sample = buffer.latest() if buffer else None
+        if not sample:
+            return {"in_kbps": 0.0, "out_kbps": 0.0}
+        return {"in_kbps": sample["in_kbps"], "out_kbps": sample["out_kbps"], "time": sample["time"]}
+
+    @classmethod
+    def latest_many(cls, devices: list[dict]) -> list[dict]:
+        """Newest rates for each of `devices` (dicts with 'ip' and 'mac')."""
+        return [
+            {"ip": d["ip"], "mac": d.get("mac"), **cls.latest(d["ip"], d.get("mac"))}
+            for d in devices
+        ]
+
+    @classmethod
+    def history(cls, ip: str, mac: str, last: int = None) -> list[dict]:
+        buffer = cls._buffers.get((ip, mac))
+        return buffer.to_list(last) if buffer else []
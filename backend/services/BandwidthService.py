@@ -1,71 +1,118 @@
 import time
-from backend.enrichment.snmp_enricher import (
-    get_in_octets_v2c, get_out_octets_v2c,
-    get_in_octets_v3, get_out_octets_v3
-)
+
+import numpy as np
+
+from backend.enrichment.snmp_enricher import get_interface_sample
+from backend.snmp.SNMPTarget import SNMPTarget
 from backend.utils.network_utils import find_main_interface_index
-from config.ConfigLoader import ConfigLoader
 
 
 class BandwidthService:
     _bandwidth_cache = {}
+    # (ip, mac) -> {"index", "if_table_last_change", "sys_uptime"}
+    _index_cache = {}
 
     @classmethod
-    def get_bandwidth(cls, ip, mac, snmp_version="v2c", community="public"):
-        try:
-            if not snmp_version:
-                # Device does not support SNMP
-                return {"in_kbps": 0.0, "out_kbps": 0.0}
-
-            if snmp_version == "v3":
-                config = ConfigLoader()
-                v3 = config.get("snmp_v3", {})
-                username = v3.get("username", "admin")
-                auth_key = v3.get("auth_key", "admin123")
-                auth_protocol = v3.get("auth_protocol", "SHA")
-
-                index = find_main_interface_index(ip, mac, snmp_version="v3", username=username, auth_key=auth_key)
-                in_octets = get_in_octets_v3(ip, index, username, auth_key, auth_protocol)
-                out_octets = get_out_octets_v3(ip, index, username, auth_key, auth_protocol)
-
-            elif snmp_version == "v2c":
-                index = find_main_interface_index(ip, mac, community=community)
-                in_octets = get_in_octets_v2c(ip, index, community)
-                out_octets = get_out_octets_v2c(ip, index, community)
-
-            else:
-                # Unsupported version
-                return {"in_kbps": 0.0, "out_kbps": 0.0}
-
-            now = time.time()
-            key = f"{ip}-{mac}"
-            prev = cls._bandwidth_cache.get(key)
-
-            cls._bandwidth_cache[key] = {
-                "time": now,
-                "in_octets": in_octets,
-                "out_octets": out_octets,
-            }
-
-            if not prev:
-                return {"in_kbps": 0.0, "out_kbps": 0.0}
-
-            time_diff = now - prev["time"]
-            if time_diff <= 0:
-                return {"in_kbps": 0.0, "out_kbps": 0.0}
+    def _sample_interface(cls, target: SNMPTarget, mac: str) -> dict:
+        """
+        Returns the interface sample for the device's main interface.
+
+        The ifIndex found by walking ifPhysAddress is cached per (ip, mac), so
+        steady-state polling costs a single GET. The cached index is dropped
+        when ifTableLastChange moves, sysUpTime goes backwards (agent restart),
+        the index disappears or the read fails.
+        """
+        key = (target.ip, mac)
+        cached = cls._index_cache.get(key)
+
+        if cached:
+            try:
+                sample = get_interface_sample(target, cached["index"])
+            except Exception:
+                cls._index_cache.pop(key, None)
+                raise
+
+            still_valid = (
+                sample["in_octets"] is not None
+                and sample["out_octets"] is not None
+                and sample["if_table_last_change"] == cached["if_table_last_change"]
+                and (sample["sys_uptime"] or 0) >= (cached["sys_uptime"] or 0)
+            )
+            if still_valid:
+                cached["sys_uptime"] = sample["sys_uptime"]
+                return sample
+
+            print(f"[Bandwidth] Interface table changed on {target.ip}, re-resolving ifIndex")
+            cls._index_cache.pop(key, None)
+            cls._bandwidth_cache.pop(f"{target.ip}-{mac}", None)
+
+        index = find_main_interface_index(
+            target.ip, mac, community=target.community, snmp_version=target.version,
+            username=target.username, auth_key=target.auth_key
+        )
+        sample = get_interface_sample(target, index)
+        if sample["in_octets"] is None or sample["out_octets"] is None:
+            raise ValueError(f"No octet counters for ifIndex {index} on {target.ip}")
+
+        cls._index_cache[key] = {
+            "index": index,
+            "if_table_last_change": sample["if_table_last_change"],
+            "sys_uptime": sample["sys_uptime"],
+        }
+        return sample
 
-            in_diff = max(0, in_octets - prev["in_octets"])
-            out_diff = max(0, out_octets - prev["out_octets"])
-
-            in_kbps = (in_diff * 8) / time_diff / 1000
-            out_kbps = (out_diff * 8) / time_diff / 1000
+    @classmethod
+    def read_counters(cls, ip, mac, snmp_version, community="public") -> dict:
+        target = SNMPTarget.from_config(ip, snmp_version, community=community)
+        sample = cls._sample_interface(target, mac)
+        return {
+            "ip": ip,
+            "mac": mac,
+            "time": time.time(),
+            "in_octets": sample["in_octets"],
+            "out_octets": sample["out_octets"],
+        }
 
-            return {
-                "in_kbps": round(in_kbps, 2),
-                "out_kbps": round(out_kbps, 2),
+    @classmethod
+    def apply_rates(cls, readings: list[dict]) -> list[dict]:
+        """
+        Turns counter readings into kbps against each device's previous reading.
+
+        The math runs over the whole batch at once: counters stay uint64 so
+        Counter64 deltas are exact, and counter resets or first samples give 0.
+        """
+        if not readings:
+            return []
+
+        prevs = [cls._bandwidth_cache.get(f"{r['ip']}-{r['mac']}") for r in readings]
+        has_prev = np.array([p is not None for p in prevs])
+
+        now = np.array([r["time"] for r in readings], dtype=np.float64)
+        in_octets = np.array([r["in_octets"] for r in readings], dtype=np.uint64)
+        out_octets = np.array([r["out_octets"] for r in readings], dtype=np.uint64)
+        prev_time = np.array([p["time"] if p else 0.0 for p in prevs], dtype=np.float64)
+        prev_in = np.array([p["in_octets"] if p else 0 for p in prevs], dtype=np.uint64)
+        prev_out = np.array([p["out_octets"] if p else 0 for p in prevs], dtype=np.uint64)
+
+        time_diff = now - prev_time
+        valid = has_prev & (time_diff > 0)
+        safe_diff = np.where(valid, time_diff, 1.0)
+
+        with np.errstate(over="ignore"):
+            in_diff = np.where(in_octets >= prev_in, in_octets - prev_in, 0).astype(np.float64)
+            out_diff = np.where(out_octets >= prev_out, out_octets - prev_out, 0).astype(np.float64)
+
+        in_kbps = np.round(np.where(valid, (in_diff * 8) / safe_diff / 1000, 0.0), 2)
+        out_kbps = np.round(np.where(valid, (out_diff * 8) / safe_diff / 1000, 0.0), 2)
+
+        for r in readings:
+            cls._bandwidth_cache[f"{r['ip']}-{r['mac']}"] = {
+                "time": r["time"],
+                "in_octets": r["in_octets"],
+                "out_octets": r["out_octets"],
             }
 
-        except Exception as e:
-            print(f"[Bandwidth Error] {ip}: {e}")
-            raise
-
+        return [
+            {"ip": r["ip"], "mac": r["mac"], "in_kbps": float(i), "out_kbps": float(o)}
+            for r, i, o in zip(readings, in_kbps, out_kbps)
+        ]
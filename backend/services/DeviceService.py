@@ -1,86 +1,442 @@
+from collections import deque
+
 from backend.domain.Computer import Computer
 from backend.domain.LANDevice import LANDevice
 from backend.domain.Router import Router
 from backend.domain.Switch import Switch
-from backend.enrichment.nmap_enricher import enrich_device_with_nmap, is_device_up_ping
+from backend.enrichment.EnrichmentCache import EnrichmentCache
+from backend.enrichment.nmap_enricher import (
+    enrich_device_with_nmap, enrich_devices_with_nmap, is_device_up_ping
+)
 from backend.enrichment.snmp_enricher import enrich_device_with_snmp
+from backend.repository.DeviceStore import DeviceStore
+from backend.scanner.neighbor_table import neighbor_is_alive
 from backend.scanner.tagger import assign_tags
+from backend.services.ARPService import ARPService
+from backend.services.EventBus import EventBus
+from backend.snmp.SNMPCapabilityCache import SNMPCapabilityCache
+from backend.utils.device_diff import diff_devices, is_empty
 from backend.utils.network_utils import get_vendor
+from config.ConfigLoader import ConfigLoader
 
 
 class DeviceService:
-    devices_cache = []
+    store = DeviceStore()
+
+    DEFAULT_CHANGE_LOG_SIZE = 1000
+
+    # Device fields each enricher owns; enrichment writes merge only these (see `_write_enrichment`)
+    NMAP_FIELDS = ("hostname", "os", "ports", "device_status", "vendor")
+    SNMP_FIELDS = ("snmp_version", "hostname", "os", "device_uptime", "device_status", "vendor")
+
+    # (version, [(kind, device), ...]) per store write; kind is 'added', 'changed' or 'removed'
+    _change_log = None
+
+    @classmethod
+    def _changes(cls) -> deque:
+        if cls._change_log is None:
+            size = ConfigLoader().get("device_store", {}).get("change_log_size", cls.DEFAULT_CHANGE_LOG_SIZE)
+            cls._change_log = deque(maxlen=max(1, int(size)))
+        return cls._change_log
+
+    @classmethod
+    def _record(cls, changes: list[tuple[str, dict]]) -> None:
+        """Logs the write that produced the current store version; call with `store.lock` held."""
+        cls._changes().append((cls.store.version, changes))
 
     @classmethod
     def get_devices(cls):
-        return cls.devices_cache
+        return cls.store.all()
+
+    @classmethod
+    def get_snapshot(cls) -> DeviceStore.Snapshot:
+        """Current immutable snapshot of the store; its `version` increases with every write."""
+        return cls.store.snapshot()
 
     @classmethod
     def set_devices(cls, devices):
-        cls.devices_cache = devices
+        with cls.store.lock:
+            previous = cls.store.all()
+            cls.store.replace_all(devices)
+            changeset = diff_devices(previous, cls.store.all())
+            cls._record(cls._changeset_entries(changeset))
+        EventBus.publish("devices", {"type": "snapshot", "devices": devices})
+
+    @classmethod
+    def apply_changeset(cls, changeset: dict) -> dict:
+        """
+        Applies a changeset computed against an earlier snapshot (see `diff_devices`) to the current store.
+
+        The changeset is rebased device by device, so writes made since it
+        was computed (enrichment, sightings, other scans) are kept: a changed
+        field is only written while the device still holds its old value, a
+        removal only happens if the device is unchanged, and an added device
+        is skipped if its id, or a device with its MAC and IP, is stored by
+        now. A device whose IP is
+        claimed by a written device is removed, as discovery does.
+
+        Returns:
+            dict: the changeset that was actually applied.
+        """
+        applied = {"added": [], "removed": [], "changed": []}
+        if is_empty(changeset):
+            return applied
+
+        with cls.store.lock:
+            snapshot = cls.store.snapshot()
+            removed = {}
+            for device in changeset["removed"]:
+                if snapshot.by_id.get(device["id"]) == device:
+                    removed[device["id"]] = device
+
+            put = {}
+            for change in changeset["changed"]:
+                current = snapshot.by_id.get(change["id"])
+                if current is None or change["id"] in removed:
+                    continue
+                fields = {k: v for k, v in change["fields"].items() if current.get(k) == v["old"]}
+                if fields:
+                    put[change["id"]] = {**current, **{k: v["new"] for k, v in fields.items()}}
+                    applied["changed"].append(
+                        {"id": change["id"], "ip": put[change["id"]]["ip"], "fields": fields,
+                         "device": put[change["id"]]}
+                    )
+            for device in changeset["added"]:
+                holder = cls.store.get_by_ip(device.get("ip"))
+                if device["id"] in snapshot.by_id or (
+                    holder and DeviceStore._mac_key(holder.get("mac")) == DeviceStore._mac_key(device.get("mac"))
+                ):
+                    continue
+                put[device["id"]] = device
+                applied["added"].append(device)
+
+            # The address now belongs to the written device
+            for device in put.values():
+                holder_id = snapshot.id_by_ip.get(device.get("ip"))
+                if holder_id is None or holder_id == device["id"] or holder_id in removed:
+                    continue
+                if holder_id in put and put[holder_id]["ip"] != device["ip"]:
+                    continue
+                removed[holder_id] = snapshot.by_id[holder_id]
+            applied["removed"] = list(removed.values())
+            applied["changed"] = [c for c in applied["changed"] if c["id"] not in removed]
+            put = {i: d for i, d in put.items() if i not in removed}
+
+            if is_empty(applied):
+                # Nothing left to write: keep the current snapshot and its version
+                return applied
+            cls.store.apply(put.values(), removed)
+            cls._record(cls._changeset_entries(applied))
+        EventBus.publish("devices", {"type": "changeset", **applied})
+        return applied
+
+    @staticmethod
+    def _changeset_entries(changeset: dict) -> list[tuple[str, dict]]:
+        return (
+            [("added", d) for d in changeset["added"]]
+            + [("changed", c["device"]) for c in changeset["changed"]]
+            + [("removed", d) for d in changeset["removed"]]
+        )
+
+    @classmethod
+    def changes_since(cls, since: str) -> dict:
+        """
+        Devices added, changed or removed after the store version named by
+        the token `since` (see `DeviceStore.Snapshot.token`).
+
+        Several writes to the same device collapse into one entry with its
+        latest state. If `since` comes from another store (e.g. before a
+        restart), is malformed or the change log no longer reaches back to
+        it, a full snapshot is returned instead, flagged with "full": True.
+
+        Returns:
+            dict: {"version", "full": False, "added", "changed", "removed"}
+            or {"version", "full": True, "devices"}; "version" is the
+            current token.
+        """
+        with cls.store.lock:
+            snapshot = cls.store.snapshot()
+            log = list(cls._changes())
+
+        epoch, _, version = since.rpartition("-")
+        since = int(version) if epoch == snapshot.epoch and version.isdigit() else -1
+        if since == snapshot.version:
+            return {"version": snapshot.token, "full": False, "added": [], "changed": [], "removed": []}
+
+        # Every store write is logged, so the log covers `since` if it reaches back to the next version
+        if not (0 <= since < snapshot.version and log and log[0][0] <= since + 1):
+            return {"version": snapshot.token, "full": True, "devices": snapshot.devices()}
+
+        # device id -> (kind relative to `since`, latest device)
+        net = {}
+        for version, changes in log:
+            if version <= since:
+                continue
+            for kind, device in changes:
+                first = net.get(device["id"], (None,))[0]
+                if first == "added":
+                    net[device["id"]] = (None, device) if kind == "removed" else ("added", device)
+                elif first == "removed" and kind == "added":
+                    net[device["id"]] = ("changed", device)
+                elif first is None:
+                    net[device["id"]] = (kind, device)
+                else:
+                    net[device["id"]] = (first if kind == "changed" else kind, device)
+
+        result = {"version": snapshot.token, "full": False, "added": [], "changed": [], "removed": []}
+        for kind, device in net.values():
+            if kind:
+                result[kind].append(device)
+        return result
+
+    @classmethod
+    def get_device(cls, device_id: str) -> dict | None:
+        return cls.store.get(device_id)
 
     @classmethod
     def get_cached_device(cls, ip: str) -> dict | None:
-        return next((d for d in cls.devices_cache if d["ip"] == ip), None)
+        return cls.store.get_by_ip(ip)
 
     @classmethod
     def get_device_by_ip(cls, ip):
-        return next((d for d in cls.devices_cache if d["ip"] == ip), None)
+        return cls.store.get_by_ip(ip)
 
     @classmethod
-    def update_device(cls, updated_device):
-        for idx, dev in enumerate(cls.devices_cache):
-            if dev["ip"] == updated_device["ip"]:
-                cls.devices_cache[idx] = updated_device
-                break
+    def get_device_by_mac(cls, mac):
+        return cls.store.get_by_mac(mac)
 
     @classmethod
-    def enrich_with_nmap(cls, ip):
+    def get_device_at(cls, ip: str, mac: str) -> dict | None:
+        """The device at `ip`, if it has this MAC."""
         device = cls.get_device_by_ip(ip)
-        if not device:
-            raise ValueError("Device not found")
+        if device and DeviceStore._mac_key(device.get("mac")) == DeviceStore._mac_key(mac):
+            return device
+        return None
 
-        enriched = enrich_device_with_nmap(device)
-        enriched["device_status"] = is_device_up_ping(ip)
+    @classmethod
+    def add_device(cls, device):
+        with cls.store.lock:
+            cls.store.add(device)
+            cls._record([("added", device)])
+        EventBus.publish("devices", {"type": "added", "device": device})
 
-        if enriched.get("mac"):
-            enriched["vendor"] = get_vendor(enriched["mac"])
+    @classmethod
+    def update_device(cls, updated_device):
+        # The store matches on id first so a device whose IP changed is still found
+        with cls.store.lock:
+            existing = cls.store.get(updated_device.get("id")) or cls.store.get_by_ip(updated_device.get("ip"))
+            if existing == {**updated_device, "id": updated_device.get("id") or (existing or {}).get("id")}:
+                # Nothing changed: keep the version (and so the ETag) and publish nothing
+                return
+            replaced = cls.store.update(updated_device)
+            if replaced is None:
+                return
+            stored = cls.store.get(updated_device.get("id") or replaced["id"])
+            if replaced["id"] == stored["id"]:
+                cls._record([("changed", stored)])
+            else:
+                cls._record([("removed", replaced), ("added", stored)])
+        EventBus.publish("devices", {"type": "updated", "device": updated_device})
+
+    @classmethod
+    def record_sighting(cls, ip: str, mac: str, hostname: str = None, add_new: bool = True) -> dict | None:
+        """
+        Merges evidence that `mac` is currently online at `ip` into the cache.
+
+        Known devices are matched by MAC and IP, else by MAC alone, marked
+        online and follow IP changes; a DHCP hostname only fills in an
+        unknown one. Unknown MACs
+        are added as new LAN devices, with their own id, when `add_new` is
+        set. A different device left holding the IP is removed, as discovery
+        does. Events are published only when something actually changed.
+
+        Returns:
+            dict | None: the cached device, or None if it was not added.
+        """
+        with cls.store.lock:
+            device = cls.get_device_at(ip, mac) or cls.get_device_by_mac(mac)
+            if device is None:
+                if not add_new:
+                    return None
+                cached = SNMPCapabilityCache.get(ip, mac)
+                new_device = ARPService.create_lan_device_from_arp(
+                    ip, mac.lower(), snmp_version=cached["version"] if cached else None
+                ).to_dict()
+                if hostname:
+                    new_device["hostname"] = hostname
+
+                # A device left holding the address is removed, as discovery does
+                cls.apply_changeset({"added": [new_device], "removed": [], "changed": []})
+                return new_device
+
+            changed = {}
+            if not device.get("device_status"):
+                changed["device_status"] = True
+            if device.get("ip") != ip:
+                changed["ip"] = ip
+            if hostname and device.get("hostname") in (None, "", "Unknown"):
+                changed["hostname"] = hostname
+
+            if not changed:
+                return device
+            cls.apply_changeset({"added": [], "removed": [], "changed": [{
+                "id": device["id"], "ip": ip, "device": {**device, **changed},
+                "fields": {k: {"old": device.get(k), "new": v} for k, v in changed.items()},
+            }]})
+            return cls.get_device(device["id"])
 
-        assign_tags(enriched)
-        cls.update_device(enriched)
+    @classmethod
+    def mark_offline(cls, ip: str) -> None:
+        with cls.store.lock:
+            device = cls.get_device_by_ip(ip)
+            if device and device.get("device_status"):
+                cls.update_device({**device, "device_status": False})
+
+    @staticmethod
+    def _is_up(ip: str) -> bool:
+        # The kernel neighbor table answers without sending anything; ping only hosts it does not know
+        alive = neighbor_is_alive(ip)
+        return is_device_up_ping(ip) if alive is None else alive
+
+    @classmethod
+    def _write_enrichment(cls, enriched: dict, fields: tuple) -> dict:
+        """
+        Merges the `fields` of an enriched copy into the device as it is stored now.
+
+        Enrichers work on a copy for seconds to minutes; merging under
+        `store.lock` keeps whatever other writers (a concurrent enrichment
+        step, a sighting, a scan) stored in the meantime. Tags are derived
+        from the merged device. A merge that changes nothing (typical for
+        results served from the enrichment cache) writes nothing.
+
+        Returns:
+            dict: the stored device, or `enriched` if the device was removed meanwhile.
+        """
+        with cls.store.lock:
+            current = cls.get_device(enriched["id"])
+            if current is None:
+                return enriched
+            merged = {**current, **{f: enriched[f] for f in fields if f in enriched}}
+            assign_tags(merged)
+            cls.update_device(merged)
+            return merged
+
+    @staticmethod
+    def _vendor(mac: str, refresh: bool = False) -> str:
+        cached = None if refresh else EnrichmentCache.get(mac, "vendor")
+        if cached is not None:
+            return cached["vendor"]
+        vendor = get_vendor(mac)
+        if vendor != "Unknown":
+            EnrichmentCache.store(mac, "vendor", {"vendor": vendor})
+        return vendor
+
+    @staticmethod
+    def _nmap(device: dict, refresh: bool = False) -> dict:
+        # Fresh cached results for this MAC replace the nmap scan entirely; otherwise
+        # only new or changed ports get service/OS detection unless `refresh` is set
+        mac = device.get("mac")
+        cached = None if refresh or not mac else EnrichmentCache.get(mac, "nmap")
+        if cached is not None:
+            return {**device, **cached}
+        return DeviceService._store_nmap(enrich_device_with_nmap(dict(device), reuse=not refresh))
+
+    @staticmethod
+    def _has_nmap_data(enriched: dict) -> bool:
+        return bool(enriched["ports"]) or enriched["hostname"] != "Unknown" or enriched["os"] != "Unknown"
+
+    @staticmethod
+    def _store_nmap(enriched: dict) -> dict:
+        # An empty result usually means the scan failed; do not cache it
+        if enriched.get("mac") and DeviceService._has_nmap_data(enriched):
+            EnrichmentCache.store(enriched["mac"], "nmap", enriched)
+        return enriched
+
+    @staticmethod
+    def _snmp(device: dict, refresh: bool = False) -> dict:
+        mac = device.get("mac")
+        cached = None if refresh or not mac else EnrichmentCache.get(mac, "snmp")
+        if cached is not None:
+            # The cache says what the host is, not whether it is up now
+            return {**device, **cached, "device_status": DeviceService._is_up(device["ip"])}
+        enriched = enrich_device_with_snmp(dict(device))
+        # "No SNMP" is not persisted; SNMPCapabilityCache already remembers it briefly
+        if mac and enriched.get("snmp_version"):
+            EnrichmentCache.store(mac, "snmp", enriched)
         return enriched
 
     @classmethod
-    def enrich_with_snmp(cls, ip):
+    def enrich_with_nmap(cls, ip, refresh: bool = False):
+        """
+        Enriches a device with nmap results, served from the enrichment cache when fresh.
+
+        Args:
+            ip (str): IP address of the device.
+            refresh (bool): Ignore cached results and run full service/OS detection.
+        """
         device = cls.get_device_by_ip(ip)
         if not device:
             raise ValueError("Device not found")
 
-        enriched = enrich_device_with_snmp(device)
+        # Stored devices are read-only; enrichers work on a copy
+        enriched = cls._nmap(device, refresh)
+        enriched["device_status"] = cls._is_up(ip)
 
         if enriched.get("mac"):
-            enriched["vendor"] = get_vendor(enriched["mac"])
+            enriched["vendor"] = cls._vendor(enriched["mac"], refresh)
 
-        assign_tags(enriched)
-        cls.update_device(enriched)
-        return enriched
+        return cls._write_enrichment(enriched, cls.NMAP_FIELDS)
+
+    @classmethod
+    def enrich_many_with_nmap(cls, ips: list[str] = None, refresh: bool = False) -> list[dict]:
+        """
+        Enriches many devices with as few nmap runs as possible.
+
+        Cached results are applied first; the remaining hosts are handed to
+        nmap in batches and each device is written to the store (and
+        published) as soon as nmap finishes it, not when the batch ends.
+
+        Args:
+            ips (list[str]): IP addresses to enrich; all known devices if omitted.
+            refresh (bool): Ignore cached results and run full service/OS detection.
+
+        Returns:
+            list[dict]: the enriched devices, in completion order.
+        """
+        devices = cls.get_devices() if ips is None else [d for d in map(cls.get_device_by_ip, ips) if d]
+
+        def finish(enriched, up):
+            enriched["device_status"] = up
+            if enriched.get("mac"):
+                enriched["vendor"] = cls._vendor(enriched["mac"], refresh)
+            return cls._write_enrichment(enriched, cls.NMAP_FIELDS)
+
+        results, to_scan = [], []
+        for device in devices:
+            cached = None if refresh or not device.get("mac") else EnrichmentCache.get(device["mac"], "nmap")
+            if cached is None:
+                to_scan.append(dict(device))
+            else:
+                results.append(finish({**device, **cached}, cls._is_up(device["ip"])))
+
+        for enriched in enrich_devices_with_nmap(to_scan, reuse=not refresh):
+            # nmap only reports hosts that are up; the others get the usual liveness check
+            up = cls._has_nmap_data(enriched) or cls._is_up(enriched["ip"])
+            results.append(finish(cls._store_nmap(enriched), up))
+        return results
 
     @classmethod
-    def enrich_with_both(cls, ip):
+    def enrich_with_snmp(cls, ip, refresh: bool = False):
         device = cls.get_device_by_ip(ip)
         if not device:
             raise ValueError("Device not found")
 
-        device = enrich_device_with_nmap(device)
-        device["device_status"] = is_device_up_ping(ip)
-        device = enrich_device_with_snmp(device)
+        enriched = cls._snmp(device, refresh)
 
-        if device.get("mac"):
-            device["vendor"] = get_vendor(device["mac"])
+        if enriched.get("mac"):
+            enriched["vendor"] = cls._vendor(enriched["mac"], refresh)
 
-        assign_tags(device)
-        cls.update_device(device)
-        return device
+        return cls._write_enrichment(enriched, cls.SNMP_FIELDS)
 
     @classmethod
     def change_device_type(cls, ip: str, new_type: str):
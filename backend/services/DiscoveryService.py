@@ -1,95 +1,463 @@
+import ipaddress
+import multiprocessing
+import queue
+import threading
 import time
-from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import ExitStack
 
 from backend.domain.LANDevice import LANDevice
 from backend.domain.Computer import Computer
 from backend.domain.Router import Router
 from backend.domain.Switch import Switch
 
-from backend.enrichment.snmp_enricher import snmp_get_status_v3, snmp_get_status_v2c
-from backend.scanner.arp_scanner import arp_scan
+from backend.enrichment.snmp_enricher import detect_snmp_version
+from backend.scanner.arp_scanner import arp_sweep
 from backend.services.ARPService import ARPService
 from backend.services.DeviceService import DeviceService
+from backend.utils.device_diff import diff_devices, summarize
+from backend.utils.network_utils import get_local_subnets
 from config.ConfigLoader import ConfigLoader
 
 
 class DiscoveryService:
-    _last_scan = 0
-    _cached_devices = []
+    _scanned_at = {}
 
+    DEFAULT_FRESHNESS = 15
+
+    STAGES = ("arp", "probe", "promote")
+
+    DEFAULT_STAGE_LIMITS = {
+        "arp_workers": 4,
+        "probe_workers": 32,
+        "promote_workers": 8,
+        "process_threshold": 1024,
+        "max_processes": 4,
+    }
 
     @staticmethod
-    def discover_lan_devices():
+    def _stage_limits() -> dict:
+        """Per-stage worker limits from the `discovery` section of config.json."""
+        conf = ConfigLoader().get("discovery", {})
+        return {
+            key: max(1, int(conf.get(key, default)))
+            for key, default in DiscoveryService.DEFAULT_STAGE_LIMITS.items()
+        }
+
+    @staticmethod
+    def _scan_targets() -> list[dict]:
+        """
+        Subnets to sweep: `discovery.subnets` from config.json if set, else every local IPv4 subnet.
+
+        Configured entries are CIDR strings or {"cidr": ..., "iface": ...} dicts;
+        without an iface the kernel route to the subnet picks one.
+        """
+        configured = ConfigLoader().get("discovery", {}).get("subnets") or []
+        if configured:
+            targets = [t if isinstance(t, dict) else {"cidr": t} for t in configured]
+        else:
+            targets = get_local_subnets()
+
+        unique = {}
+        for target in targets:
+            cidr = str(ipaddress.ip_network(target["cidr"], strict=False))
+            unique.setdefault(cidr, {"cidr": cidr, "iface": target.get("iface")})
+        return list(unique.values())
+
+    @staticmethod
+    def _freshness(cidr: str) -> float:
+        """
+        Seconds a subnet's scan result stays fresh, from `discovery.freshness` in config.json.
+
+        The setting is either a number for all subnets or a dict mapping CIDRs
+        to seconds, with an optional "default"; the most specific CIDR that
+        contains the subnet wins.
+        """
+        conf = ConfigLoader().get("discovery", {}).get("freshness", DiscoveryService.DEFAULT_FRESHNESS)
+        if not isinstance(conf, dict):
+            return float(conf)
+
+        network = ipaddress.ip_network(cidr)
+        best, best_prefix = conf.get("default", DiscoveryService.DEFAULT_FRESHNESS), -1
+        for key, seconds in conf.items():
+            if key == "default":
+                continue
+            candidate = ipaddress.ip_network(key, strict=False)
+            if network.subnet_of(candidate) and candidate.prefixlen > best_prefix:
+                best, best_prefix = seconds, candidate.prefixlen
+        return float(best)
+
+    @staticmethod
+    def snapshot_info(targets: list[dict] = None) -> dict:
+        """
+        Age of the current device snapshot, overall and per subnet.
+
+        `age_s` is the age of the oldest subnet result (None if a subnet was
+        never scanned); a subnet is stale once its age exceeds its freshness.
+        """
+        targets = targets if targets is not None else DiscoveryService._scan_targets()
         now = time.time()
-        if now - DiscoveryService._last_scan > 15:
-            raw = arp_scan()
-            new_scan = ARPService.create_lan_devices_from_arp_scan(raw)
-
-            previous_devices = {d["ip"]: d for d in DeviceService.get_devices()}
-            config = ConfigLoader()
-            v3 = config.get("snmp_v3", {})
-            username = v3.get("username", "admin")
-            auth_key = v3.get("auth_key", "admin123")
-
-            updated_devices = []
-
-            for new_dev in new_scan:
-                ip = new_dev.ip
-                prev_dev = previous_devices.pop(ip, None)
-
-                if snmp_get_status_v3(ip, username, auth_key):
-                    new_dev.snmp_version = "v3"
-                elif snmp_get_status_v2c(ip, "public"):
-                    new_dev.snmp_version = "v2c"
-                else:
-                    new_dev.snmp_version = None
-
-                if prev_dev:
-                    # Reuse ID
-                    if "id" in prev_dev:
-                        new_dev._id = prev_dev["id"]
-
-                    # Merge enriched fields
-                    enriched_fields = ["vendor", "os", "hostname", "tags", "ports", "device_uptime"]
-                    new_dict = new_dev.to_dict()
-                    for field in enriched_fields:
-                        if field in prev_dev and prev_dev[field]:
-                            new_dict[field] = prev_dev[field]
-
-                    # Use previous type
-                    prev_type = prev_dev.get("type", "LANDevice")
-                    promoted_dict = DeviceService.change_device_class(new_dict, prev_type)
-
-                    if prev_type == "Router":
-                        promoted_device = Router.from_dict(promoted_dict)
-                    elif prev_type == "Switch":
-                        promoted_device = Switch.from_dict(promoted_dict)
-                    elif prev_type == "Computer":
-                        promoted_device = Computer.from_dict(promoted_dict)
-                    else:
-                        promoted_device = LANDevice.from_dict(promoted_dict)
-
-                    updated_devices.append(promoted_device)
-                else:
-                    updated_devices.append(new_dev)
-
-            # Add offline devices
-            for ip, old_dev in previous_devices.items():
-                old_dev["device_status"] = False
-
-                prev_type = old_dev.get("type", "LANDevice")
-                if prev_type == "Router":
-                    restored = Router.from_dict(old_dev)
-                elif prev_type == "Switch":
-                    restored = Switch.from_dict(old_dev)
-                elif prev_type == "Computer":
-                    restored = Computer.from_dict(old_dev)
-                else:
-                    restored = LANDevice.from_dict(old_dev)
-
-                updated_devices.append(restored)
-
-            DiscoveryService._cached_devices = updated_devices
-            DiscoveryService._last_scan = now
-
-        return [d.to_dict() for d in DiscoveryService._cached_devices]
+        subnets = {}
+        for target in targets:
+            scanned_at = DiscoveryService._scanned_at.get(target["cidr"])
+            age = round(now - scanned_at, 3) if scanned_at else None
+            fresh_for = DiscoveryService._freshness(target["cidr"])
+            subnets[target["cidr"]] = {
+                "scanned_at": scanned_at,
+                "age_s": age,
+                "fresh_for_s": fresh_for,
+                "stale": age is None or age > fresh_for,
+            }
+
+        ages = [s["age_s"] for s in subnets.values()]
+        return {
+            "age_s": None if None in ages or not ages else max(ages),
+            "stale": any(s["stale"] for s in subnets.values()),
+            "subnets": subnets,
+        }
+
+    @staticmethod
+    def _device_class(type_name: str):
+        return {
+            "Router": Router,
+            "Switch": Switch,
+            "Computer": Computer,
+        }.get(type_name, LANDevice)
+
+    @staticmethod
+    def _timed(fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        return result, start, time.perf_counter()
+
+    @staticmethod
+    def _sweep_into(cidr: str, iface: str, relay, stop=None) -> None:
+        """Runs in a worker process: sweeps one subnet and relays replies, then a None sentinel."""
+        try:
+            for entry in arp_sweep(cidr, iface=iface, stop=stop):
+                relay.put(entry)
+        finally:
+            relay.put(None)
+
+    @staticmethod
+    def _arp_stage(target: dict, arrivals: queue.Queue, cancel, process_pool=None, manager=None) -> int:
+        """
+        ARP stage: streams replies into `arrivals` so probing starts on the first one.
+
+        With a process pool the sweep runs in a separate process, so building
+        and sending packets for a large subnet does not compete with the
+        other sweeps for the GIL; replies are relayed back through a manager
+        queue as they arrive. Setting `cancel` stops the sweep after its
+        current chunk.
+        """
+        count = 0
+        if process_pool is None:
+            for entry in arp_sweep(target["cidr"], iface=target["iface"], stop=cancel):
+                arrivals.put(entry)
+                count += 1
+            return count
+
+        relay = manager.Queue()
+        stop = manager.Event()
+        future = process_pool.submit(DiscoveryService._sweep_into, target["cidr"], target["iface"], relay, stop)
+        while True:
+            if cancel.is_set():
+                stop.set()
+            try:
+                entry = relay.get(timeout=0.5)
+            except queue.Empty:
+                if future.done() and future.exception():
+                    raise future.exception()
+                continue
+            if entry is None:
+                break
+            arrivals.put(entry)
+            count += 1
+        future.result()
+        return count
+
+    @staticmethod
+    def _probe_host(entry: dict) -> dict:
+        """Probe stage: the only place a scan detects a host's SNMP capability."""
+        snmp_version = detect_snmp_version(entry['ip'], entry['mac'])
+        return {"ip": entry['ip'], "mac": entry['mac'], "snmp_version": snmp_version}
+
+    @staticmethod
+    def _mac_key(mac: str) -> str:
+        return (mac or "").lower().replace("-", ":")
+
+    @staticmethod
+    def _match_previous(observed: dict, previous_devices: dict, previous_by_mac: dict, matched_ids: set,
+                        seen_ips: set) -> tuple[dict | None, list[dict]]:
+        """
+        Candidates among the previous devices for a probed host.
+
+        Returns:
+            tuple: the unmatched previous device with the host's MAC and IP,
+            or None; and the unmatched previous devices with its MAC whose
+            address has not answered (so far) in this scan.
+        """
+        mac = DiscoveryService._mac_key(observed["mac"])
+        exact = previous_devices.get(observed["ip"])
+        if exact is not None and (DiscoveryService._mac_key(exact.get("mac")) != mac or exact["id"] in matched_ids):
+            exact = None
+        moved = [
+            d for d in previous_by_mac.get(mac, [])
+            if d["id"] not in matched_ids and d["ip"] not in seen_ips
+        ]
+        return exact, moved
+
+    @staticmethod
+    def _promote(observed: dict, prev_dev: dict | None) -> dict:
+        """
+        Promotion stage: reconciles a probed host with its previous state.
+
+        Unknown hosts become new LANDevices. For known hosts only the scanned
+        fields are compared; an unchanged device is returned as the very same
+        dict, and a changed one is re-materialized through its own class (so
+        validators run) with its id, type and enriched fields intact.
+        """
+        if not prev_dev:
+            return ARPService.create_lan_device_from_arp(
+                observed["ip"], observed["mac"], snmp_version=observed["snmp_version"]
+            ).to_dict()
+
+        patch = {
+            key: value
+            for key, value in (
+                ("ip", observed["ip"]),
+                ("snmp_version", observed["snmp_version"]),
+                ("device_status", True),
+            )
+            if prev_dev.get(key) != value
+        }
+        if not patch:
+            return prev_dev
+
+        device_class = DiscoveryService._device_class(prev_dev.get("type", "LANDevice"))
+        return device_class.from_dict({**prev_dev, **patch}).to_dict()
+
+    @staticmethod
+    def _run_pipeline(targets: list[dict], previous_devices: dict, progress=None, cancel=None) -> tuple[list, dict]:
+        """
+        Runs ARP -> SNMP probe -> class promotion as a streaming pipeline.
+
+        Each stage has its own bounded worker pool, and a host moves to the next
+        stage as soon as its previous stage finishes, so the scan takes as long
+        as the slowest host rather than the sum of all hosts. Every host passes
+        each stage exactly once. All `targets` ({'cidr', 'iface'}) are swept in
+        parallel; subnets with more than `process_threshold` hosts are swept in
+        worker processes. Replies from all subnets merge into one device table.
+
+        `progress(kind, data)`, if given, is called from the pipeline thread
+        as results arrive: 'reply' with each ARP entry, 'subnet' with a swept
+        CIDR and 'device' with each finished device dict. Setting the `cancel`
+        event stops the scan early; devices finished so far are returned and
+        previous devices are not marked offline. Previous devices outside the
+        scanned subnets are carried over unchanged.
+
+        Hosts are matched to `previous_devices` (keyed by IP) by MAC and IP
+        first. A host whose pair is unknown takes over a previous device with
+        its MAC only if that device's address did not answer this scan, so a
+        device that moved keeps its identity while a host answering on
+        several addresses (one per VLAN) keeps one device per address. Each
+        previous device is matched at most once. A previous device whose
+        address now answers with a different MAC is dropped.
+
+        Returns the device dicts and a timing report: per stage, the number of
+        tasks, their summed run time (busy_s) and first-start to last-finish
+        (wall_s), plus the replies per subnet.
+        """
+        progress = progress or (lambda kind, data: None)
+        cancel = cancel or threading.Event()
+        limits = DiscoveryService._stage_limits()
+        large = {
+            t["cidr"] for t in targets
+            if ipaddress.ip_network(t["cidr"]).num_addresses > limits["process_threshold"]
+        }
+        subnets = {
+            t["cidr"]: {"iface": t["iface"], "mode": "process" if t["cidr"] in large else "thread", "replies": 0}
+            for t in targets
+        }
+        updated_devices = []
+        seen_ips = set()
+        previous_by_mac = {}
+        for device in previous_devices.values():
+            previous_by_mac.setdefault(DiscoveryService._mac_key(device.get("mac")), []).append(device)
+        matched_ids = set()
+        # Probed hosts waiting for every sweep to finish before falling back to a MAC-only match
+        deferred = []
+        sweeps_running = len(targets)
+
+        started = time.perf_counter()
+        spans = {stage: [] for stage in DiscoveryService.STAGES}
+        timed = DiscoveryService._timed
+
+        with ExitStack() as stack:
+            arp_pool = stack.enter_context(
+                ThreadPoolExecutor(limits["arp_workers"], thread_name_prefix="discovery-arp")
+            )
+            probe_pool = stack.enter_context(
+                ThreadPoolExecutor(limits["probe_workers"], thread_name_prefix="discovery-probe")
+            )
+            promote_pool = stack.enter_context(
+                ThreadPoolExecutor(limits["promote_workers"], thread_name_prefix="discovery-promote")
+            )
+            process_pool = manager = None
+            if large:
+                # spawn, not fork: the server process already runs background threads
+                context = multiprocessing.get_context("spawn")
+                manager = stack.enter_context(context.Manager())
+                process_pool = stack.enter_context(ProcessPoolExecutor(
+                    min(limits["max_processes"], len(large)), mp_context=context
+                ))
+
+            arrivals = queue.Queue()
+            pending = {}
+            for target in targets:
+                pool_args = (process_pool, manager) if target["cidr"] in large else ()
+                future = arp_pool.submit(timed, DiscoveryService._arp_stage, target, arrivals, cancel, *pool_args)
+                pending[future] = ("arp", target["cidr"])
+
+            while pending or not arrivals.empty():
+                if cancel.is_set():
+                    # Queued work is dropped; running tasks finish as the pools shut down
+                    for future in pending:
+                        future.cancel()
+                    break
+
+                # Hand freshly answered hosts to the probe stage
+                while not arrivals.empty():
+                    entry = arrivals.get_nowait()
+                    if entry['ip'] in seen_ips:
+                        continue
+                    seen_ips.add(entry['ip'])
+                    progress("reply", entry)
+                    future = probe_pool.submit(timed, DiscoveryService._probe_host, entry)
+                    pending[future] = ("probe", entry)
+
+                done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, context = pending.pop(future)
+                    if stage == "arp":
+                        sweeps_running -= 1
+                    try:
+                        result, start, end = future.result()
+                    except Exception as e:
+                        print(f"[!] Discovery {stage} stage failed for {context}: {e}")
+                        continue
+                    spans[stage].append((start, end))
+
+                    if stage == "arp":
+                        subnets[context]["replies"] = result
+                        progress("subnet", context)
+
+                    elif stage == "probe":
+                        deferred.append(result)
+
+                    elif stage == "promote":
+                        updated_devices.append(result)
+                        progress("device", result)
+
+                # Exact matches are promoted at once; MAC-only matches once no sweep can still answer
+                waiting = []
+                for observed in deferred:
+                    exact, moved = DiscoveryService._match_previous(
+                        observed, previous_devices, previous_by_mac, matched_ids, seen_ips
+                    )
+                    if exact is None and moved and sweeps_running:
+                        waiting.append(observed)
+                        continue
+                    prev_dev = exact or (moved[0] if moved else None)
+                    if prev_dev:
+                        matched_ids.add(prev_dev["id"])
+                    future = promote_pool.submit(timed, DiscoveryService._promote, observed, prev_dev)
+                    pending[future] = ("promote", observed["ip"])
+                deferred = waiting
+
+        # Keep devices that did not answer; only those inside a fully swept subnet go offline
+        networks = [ipaddress.ip_network(t["cidr"]) for t in targets]
+        for ip, old_dev in previous_devices.items():
+            if old_dev["id"] in matched_ids or ip in seen_ips:
+                # Seen this scan, or its address now belongs to another MAC
+                continue
+            in_scope = any(ipaddress.ip_address(ip) in net for net in networks)
+            if in_scope and not cancel.is_set() and old_dev.get("device_status"):
+                old_dev = {**old_dev, "device_status": False}
+            updated_devices.append(old_dev)
+
+        updated_devices.sort(key=lambda d: ipaddress.ip_address(d["ip"]))
+
+        report = {
+            "total_s": round(time.perf_counter() - started, 3),
+            "cancelled": cancel.is_set(),
+            "stages": {},
+            "subnets": subnets,
+        }
+        for stage, stage_spans in spans.items():
+            report["stages"][stage] = {
+                "tasks": len(stage_spans),
+                "busy_s": round(sum(end - start for start, end in stage_spans), 3),
+                "wall_s": round(
+                    max((end for _, end in stage_spans), default=0)
+                    - min((start for start, _ in stage_spans), default=0), 3
+                ),
+            }
+        return updated_devices, report
+
+    @staticmethod
+    def run_scan(targets: list[dict] = None, progress=None, cancel=None) -> tuple[list[dict], dict, dict]:
+        """
+        Scans `targets` (default: `_scan_targets()`) and stores the result.
+
+        A completed scan is applied to the DeviceService cache as a changeset
+        (see `device_diff.diff_devices` and `DeviceService.apply_changeset`)
+        and marks its subnets fresh; the returned changeset is what was
+        actually written. A cancelled one leaves both untouched and only
+        returns what it found so far, with an empty changeset.
+
+        Returns:
+            tuple: (devices, report, changeset)
+        """
+        targets = targets if targets is not None else DiscoveryService._scan_targets()
+        current = DeviceService.get_devices()
+        previous_devices = {d["ip"]: d for d in current}
+
+        devices, report = DiscoveryService._run_pipeline(targets, previous_devices, progress, cancel)
+        changeset = {"added": [], "removed": [], "changed": []}
+        if not report["cancelled"]:
+            finished = time.time()
+            for target in targets:
+                DiscoveryService._scanned_at[target["cidr"]] = finished
+            # Rebased onto the store as it is now; writes made during the scan are kept
+            changeset = DeviceService.apply_changeset(diff_devices(current, devices))
+        report["changes"] = summarize(changeset)
+        return devices, report, changeset
+
+    @staticmethod
+    def discover_lan_devices(revalidate: bool = True, snapshot=None) -> dict:
+        """
+        Stale-while-revalidate view of the network.
+
+        Returns the last known devices immediately together with the store
+        version they come from and the snapshot's age. Subnets older than
+        their freshness window are rescanned by a background scan job, whose
+        summary is included; its results arrive through the 'devices' and
+        'scans' events. Pass a DeviceStore snapshot to answer from it.
+        """
+        from backend.services.ScanJobService import ScanJobService
+
+        snapshot = snapshot or DeviceService.get_snapshot()
+        targets = DiscoveryService._scan_targets()
+        info = DiscoveryService.snapshot_info(targets)
+        job = None
+        stale = [cidr for cidr, subnet in info["subnets"].items() if subnet["stale"]]
+        if revalidate and stale:
+            job, _ = ScanJobService.submit(stale)
+
+        return {
+            "devices": snapshot.devices(),
+            "version": snapshot.token,
+            "snapshot": info,
+            "revalidating": job.to_dict(include_devices=False) if job else None,
+        }
@@ -0,0 +1,278 @@
+import heapq
+import itertools
+import threading
+import time
+import uuid
+
+from backend.services.DeviceService import DeviceService
+from backend.services.EventBus import EventBus
+from config.ConfigLoader import ConfigLoader
+
+
+class EnrichmentJobService:
+    """
+    Queues device enrichment and runs it on per-subsystem worker pools.
+
+    A job enriches one device, or a batch of devices sharing nmap runs, from
+    one source ('nmap', 'snmp' or 'both') and is made of steps, each run by
+    the pool of its subsystem, so a slow nmap scan never holds up SNMP
+    queries. Steps wait in a priority queue per subsystem; lower numbers run
+    first and FIFO order is kept within a priority. A request for devices and
+    a source that an in-flight job already covers joins that job, raising its
+    priority if needed. Steps of different jobs for one device may run at the
+    same time; each merges only the fields it owns into the stored device
+    (see `DeviceService._write_enrichment`). Job progress is published on the
+    'enrichment' EventBus topic. Configured in config.json:
+
+        "enrichment_jobs": {"workers": {"nmap": 2, "snmp": 8}}
+    """
+
+    PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+    SOURCE_STEPS = {
+        "nmap": ("nmap",),
+        "snmp": ("snmp",),
+        "both": ("nmap", "snmp"),
+    }
+    DEFAULT_WORKERS = {"nmap": 2, "snmp": 8}
+    MAX_FINISHED_JOBS = 200
+
+    _jobs = {}
+    _queues = {}
+    _workers = {}
+    _lock = threading.Lock()
+    _sequence = itertools.count()
+
+    class EnrichmentJob:
+        def __init__(self, ips: tuple[str, ...], source: str, priority: int, refresh: bool):
+            self.id = str(uuid.uuid4())
+            self.ips = ips
+            self.source = source
+            self.steps = EnrichmentJobService.SOURCE_STEPS[source]
+            self.priority = priority
+            self.refresh = refresh
+            self.step = 0
+            self.status = "queued"
+            self.created_at = time.time()
+            self.started_at = None
+            self.finished_at = None
+            self.error = None
+            self.devices = []
+            self.done = threading.Event()
+            self.lock = threading.Lock()
+
+        @property
+        def ip(self) -> str | None:
+            # Single-device jobs only
+            return self.ips[0] if len(self.ips) == 1 else None
+
+        @property
+        def running(self) -> bool:
+            return self.status in ("queued", "running")
+
+        def to_dict(self) -> dict:
+            with self.lock:
+                return {
+                    "id": self.id,
+                    "ip": self.ip,
+                    "ips": list(self.ips),
+                    "source": self.source,
+                    "priority": self.priority,
+                    "refresh": self.refresh,
+                    "status": self.status,
+                    "steps": list(self.steps),
+                    "steps_done": self.step,
+                    "created_at": self.created_at,
+                    "started_at": self.started_at,
+                    "finished_at": self.finished_at,
+                    "error": self.error,
+                    "device": self.devices[0] if self.ip and self.devices else None,
+                    "devices": list(self.devices),
+                }
+
+    @classmethod
+    def _publish(cls, job: "EnrichmentJobService.EnrichmentJob", kind: str) -> None:
+        EventBus.publish("enrichment", {"job_id": job.id, "type": kind, "job": job.to_dict()})
+
+    @classmethod
+    def _run_step(cls, subsystem: str, job: "EnrichmentJobService.EnrichmentJob") -> list[dict]:
+        if subsystem == "nmap":
+            if job.ip is None:
+                # A batch shares nmap runs (see DeviceService.enrich_many_with_nmap)
+                return DeviceService.enrich_many_with_nmap(list(job.ips), job.refresh)
+            return [DeviceService.enrich_with_nmap(job.ip, job.refresh)]
+        return [DeviceService.enrich_with_snmp(ip, job.refresh) for ip in job.ips]
+
+    @classmethod
+    def _enqueue(cls, job: "EnrichmentJobService.EnrichmentJob") -> None:
+        # Called with cls._lock held
+        subsystem = job.steps[job.step]
+        if subsystem not in cls._queues:
+            cls._start_pool(subsystem)
+        queue, available = cls._queues[subsystem]
+        heapq.heappush(queue, (job.priority, next(cls._sequence), job.step, job))
+        available.notify()
+
+    @classmethod
+    def _start_pool(cls, subsystem: str) -> None:
+        # Called with cls._lock held
+        conf = ConfigLoader().get("enrichment_jobs", {})
+        size = conf.get("workers", {}).get(subsystem, cls.DEFAULT_WORKERS.get(subsystem, 1))
+        cls._queues[subsystem] = ([], threading.Condition(cls._lock))
+        cls._workers[subsystem] = [
+            threading.Thread(target=cls._worker, args=(subsystem,), name=f"enrich-{subsystem}-{i}", daemon=True)
+            for i in range(size)
+        ]
+        for worker in cls._workers[subsystem]:
+            worker.start()
+
+    @classmethod
+    def _next(cls, subsystem: str) -> tuple["EnrichmentJobService.EnrichmentJob", int]:
+        queue, available = cls._queues[subsystem]
+        with cls._lock:
+            while True:
+                while not queue:
+                    available.wait()
+                _, _, step, job = heapq.heappop(queue)
+                # A job re-queued at a higher priority leaves a stale entry behind
+                if job.status == "queued" and job.step == step:
+                    job.status = "running"
+                    return job, step
+
+    @classmethod
+    def _worker(cls, subsystem: str) -> None:
+        while True:
+            job, step = cls._next(subsystem)
+            with job.lock:
+                job.started_at = job.started_at or time.time()
+            if step == 0:
+                cls._publish(job, "started")
+
+            try:
+                devices = cls._run_step(subsystem, job)
+            except Exception as e:
+                print(f"[!] Enrichment job {job.id} ({subsystem} on {', '.join(job.ips)}) failed: {e}")
+                with job.lock:
+                    job.error = str(e)
+                cls._finish(job, "failed")
+                continue
+
+            with cls._lock:
+                with job.lock:
+                    job.devices = devices
+                    job.step += 1
+                    more = job.step < len(job.steps)
+                    if more:
+                        job.status = "queued"
+                if more:
+                    cls._enqueue(job)
+            if more:
+                cls._publish(job, "step")
+            else:
+                cls._finish(job, "completed")
+
+    @classmethod
+    def _finish(cls, job: "EnrichmentJobService.EnrichmentJob", status: str) -> None:
+        with cls._lock:
+            with job.lock:
+                job.status = status
+                job.finished_at = time.time()
+        job.done.set()
+        cls._publish(job, "finished")
+        cls._prune()
+
+    @classmethod
+    def _prune(cls) -> None:
+        with cls._lock:
+            finished = sorted(
+                (j for j in cls._jobs.values() if not j.running), key=lambda j: j.finished_at or 0
+            )
+            for job in finished[:-cls.MAX_FINISHED_JOBS]:
+                del cls._jobs[job.id]
+
+    @classmethod
+    def _submit(cls, ips: tuple[str, ...], source: str, priority: str,
+                refresh: bool) -> tuple["EnrichmentJobService.EnrichmentJob", bool]:
+        if source not in cls.SOURCE_STEPS:
+            raise ValueError(f"Unknown enrichment source: {source}")
+        if priority not in cls.PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+
+        rank = cls.PRIORITIES[priority]
+        steps = set(cls.SOURCE_STEPS[source])
+        with cls._lock:
+            for job in cls._jobs.values():
+                if not (job.running and set(ips) <= set(job.ips) and steps <= set(job.steps[job.step:])):
+                    continue
+                if refresh and not job.refresh:
+                    # That job may answer from the enrichment cache
+                    continue
+                if rank < job.priority:
+                    job.priority = rank
+                    if job.status == "queued":
+                        cls._enqueue(job)
+                return job, False
+
+            job = cls.EnrichmentJob(ips, source, rank, refresh)
+            cls._jobs[job.id] = job
+            cls._enqueue(job)
+        cls._publish(job, "queued")
+        return job, True
+
+    @classmethod
+    def submit(cls, ip: str, source: str = "both", priority: str = "normal",
+               refresh: bool = False) -> tuple["EnrichmentJobService.EnrichmentJob", bool]:
+        """
+        Queues enrichment of the device at `ip`.
+
+        Args:
+            ip (str): IP address of the device.
+            source (str): 'nmap', 'snmp' or 'both'.
+            priority (str): 'high', 'normal' or 'low'.
+            refresh (bool): Ignore cached results (see DeviceService.enrich_with_nmap).
+
+        Returns:
+            tuple: the job, and False if an in-flight job for the same device
+            already covering `source` was returned instead of a new one.
+
+        Raises:
+            ValueError: If the source or priority is unknown, or the device does not exist.
+        """
+        if not DeviceService.get_device_by_ip(ip):
+            raise ValueError("Device not found")
+        return cls._submit((ip,), source, priority, refresh)
+
+    @classmethod
+    def submit_batch(cls, ips: list[str] = None, priority: str = "low",
+                     refresh: bool = False) -> tuple["EnrichmentJobService.EnrichmentJob", bool]:
+        """
+        Queues one nmap job for many devices, scanned in shared nmap runs.
+
+        Args:
+            ips (list[str]): IP addresses to enrich; all known devices if
+                omitted. Unknown addresses are ignored.
+            priority (str): 'high', 'normal' or 'low'.
+            refresh (bool): Ignore cached results.
+
+        Returns:
+            tuple: the job, and False if an in-flight job already covering
+            these devices was returned instead.
+
+        Raises:
+            ValueError: If the priority is unknown or no device is left to enrich.
+        """
+        if ips is None:
+            ips = [d["ip"] for d in DeviceService.get_devices()]
+        ips = tuple(dict.fromkeys(ip for ip in ips if DeviceService.get_device_by_ip(ip)))
+        if not ips:
+            raise ValueError("No devices to enrich")
+        return cls._submit(ips, "nmap", priority, refresh)
+
+    @classmethod
+    def get(cls, job_id: str) -> "EnrichmentJobService.EnrichmentJob | None":
+        return cls._jobs.get(job_id)
+
+    @classmethod
+    def list_jobs(cls, ip: str = None) -> list[dict]:
+        with cls._lock:
+            jobs = [j for j in cls._jobs.values() if ip is None or ip in j.ips]
+        return [j.to_dict() for j in sorted(jobs, key=lambda j: j.created_at, reverse=True)]
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import time
+
+
+class EventBus:
+    """
+    In-process publish/subscribe hub used to push updates to streaming clients.
+
+    Publishers run anywhere (request threads, the bandwidth poller, scan
+    workers) and call `publish`. Each subscriber owns a bounded asyncio queue
+    on the server's event loop; events are handed over with
+    `call_soon_threadsafe`. A slow subscriber loses its oldest events rather
+    than blocking publishers.
+
+    Topics in use:
+        'bandwidth' - {"devices": [{"ip", "mac", "in_kbps", "out_kbps"}], "time"}
+        'devices'   - device state changes, {"type": ..., ...}; scans send
+                      {"type": "changeset", "added", "removed", "changed"}
+        'scans'     - scan job progress, {"job_id", "type": ..., ...}
+        'enrichment'- enrichment job progress, {"job_id", "type": ..., "job"}
+    """
+
+    QUEUE_SIZE = 256
+
+    _subscribers = set()
+    _lock = threading.Lock()
+
+    class Subscription:
+        def __init__(self, topics: set[str], loop: asyncio.AbstractEventLoop):
+            self.topics = topics
+            self.loop = loop
+            self.queue = asyncio.Queue(maxsize=EventBus.QUEUE_SIZE)
+
+        def _deliver(self, event: dict) -> None:
+            # Runs on the subscriber's event loop
+            if self.queue.full():
+                self.queue.get_nowait()
+            self.queue.put_nowait(event)
+
+    @classmethod
+    def subscribe(cls, topics: set[str]) -> "EventBus.Subscription":
+        """Registers a subscriber; must be called from a coroutine on the server loop."""
+        subscription = cls.Subscription(set(topics), asyncio.get_running_loop())
+        with cls._lock:
+            cls._subscribers.add(subscription)
+        return subscription
+
+    @classmethod
+    def unsubscribe(cls, subscription: "EventBus.Subscription") -> None:
+        with cls._lock:
+            cls._subscribers.discard(subscription)
+
+    @classmethod
+    def publish(cls, topic: str, data: dict) -> None:
+        """Sends an event to every subscriber of `topic`. Safe to call from any thread."""
+        event = {"topic": topic, "time": time.time(), "data": data}
+        with cls._lock:
+            subscribers = [s for s in cls._subscribers if topic in s.topics]
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, event)
+            except RuntimeError:
+                # Event loop already closed; the stream is going away
+                cls.unsubscribe(subscription)
@@ -0,0 +1,143 @@
+import ipaddress
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.enrichment.nmap_enricher import is_device_up_ping
+from backend.scanner.neighbor_table import DEAD_STATES, is_alive, is_unconfirmed, read_neighbor_table
+from backend.services.DeviceService import DeviceService
+from config.ConfigLoader import ConfigLoader
+
+
+class NeighborService:
+    """
+    Liveness and discovery from the kernel neighbor table.
+
+    The kernel already tracks which hosts on the attached subnets answered
+    recently. Reading that table is a single file/netlink dump, so the whole
+    fleet can be refreshed in milliseconds without sending a packet; only
+    stale entries that would bring a device online, move it or add it are
+    confirmed with a ping first. Configured in config.json:
+
+        "neighbor_table": {"enabled": true, "interval": 5, "add_new": true}
+    """
+
+    PING_WORKERS = 32
+
+    _thread = None
+    _stop = threading.Event()
+
+    @classmethod
+    def _settings(cls) -> dict:
+        conf = ConfigLoader().get("neighbor_table", {})
+        return {
+            "enabled": bool(conf.get("enabled", True)),
+            "interval": float(conf.get("interval", 5)),
+            "add_new": bool(conf.get("add_new", True)),
+        }
+
+    @staticmethod
+    def _would_change(entry: dict, ips_by_mac: dict[str, set[str]], add_new: bool) -> bool:
+        """
+        Whether sighting `entry` would bring a device online, move it or add one.
+
+        A host answering on several addresses (one MAC, several IPs) is not
+        moved while the table still lists its current address for that MAC.
+        """
+        device = DeviceService.get_device_at(entry["ip"], entry["mac"])
+        if device is not None:
+            return not device.get("device_status")
+        device = DeviceService.get_device_by_mac(entry["mac"])
+        if device is None:
+            return add_new
+        return device.get("ip") not in ips_by_mac[entry["mac"]]
+
+    @classmethod
+    def refresh(cls, add_new: bool = None) -> dict:
+        """
+        Merges the current neighbor table into the DeviceService cache.
+
+        Recently confirmed entries mark their device online (and follow IP
+        changes, unless the table still lists the device's current address
+        for its MAC); stale ones (and every resolved entry read from /proc) do
+        so only if the host answers a ping. Failed or incomplete entries
+        mark the device at that IP offline.
+        Hosts absent from the table are left untouched, since the kernel
+        simply has not talked to them lately.
+
+        Args:
+            add_new (bool): add devices for unknown MACs; defaults to config.
+
+        Returns:
+            dict: counts of alive/offline/added entries and the elapsed time.
+        """
+        if add_new is None:
+            add_new = cls._settings()["add_new"]
+
+        started = time.perf_counter()
+        entries = read_neighbor_table()
+        ips_by_mac = {}
+        for entry in entries:
+            if is_alive(entry) or is_unconfirmed(entry):
+                ips_by_mac.setdefault(entry["mac"], set()).add(entry["ip"])
+        alive = [e for e in entries if is_alive(e)]
+        unconfirmed = [e for e in entries if is_unconfirmed(e) and cls._would_change(e, ips_by_mac, add_new)]
+        if unconfirmed:
+            workers = min(cls.PING_WORKERS, len(unconfirmed))
+            with ThreadPoolExecutor(workers, thread_name_prefix="neighbor-ping") as pool:
+                answered = pool.map(lambda e: is_device_up_ping(e["ip"]), unconfirmed)
+                alive += [e for e, up in zip(unconfirmed, answered) if up]
+        alive_ips = {e["ip"] for e in alive}
+
+        added = 0
+        # Sorted, so a host that moved settles on the same address every refresh
+        for entry in sorted(alive, key=lambda e: ipaddress.ip_address(e["ip"])):
+            # Re-checked per entry: an earlier entry may just have moved or added the device
+            if not cls._would_change(entry, ips_by_mac, add_new):
+                continue
+            known = DeviceService.get_device_by_mac(entry["mac"]) is not None
+            if DeviceService.record_sighting(entry["ip"], entry["mac"], add_new=add_new) and not known:
+                added += 1
+
+        offline = 0
+        for entry in entries:
+            if entry["state"] in DEAD_STATES and entry["ip"] not in alive_ips:
+                device = DeviceService.get_device_by_ip(entry["ip"])
+                if device and device.get("device_status"):
+                    DeviceService.mark_offline(entry["ip"])
+                    offline += 1
+
+        return {
+            "time": time.time(),
+            "entries": len(entries),
+            "alive": len(alive),
+            "offline": offline,
+            "added": added,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    @classmethod
+    def _run(cls, settings: dict) -> None:
+        while not cls._stop.is_set():
+            try:
+                cls.refresh(settings["add_new"])
+            except Exception as e:
+                print(f"[!] Neighbor table refresh failed: {e}")
+            cls._stop.wait(settings["interval"])
+
+    @classmethod
+    def start(cls) -> None:
+        settings = cls._settings()
+        if not settings["enabled"] or (cls._thread and cls._thread.is_alive()):
+            return
+        cls._stop.clear()
+        cls._thread = threading.Thread(target=cls._run, args=(settings,), name="neighbor-table", daemon=True)
+        cls._thread.start()
+        print("[+] Neighbor table refresher started")
+
+    @classmethod
+    def stop(cls) -> None:
+        cls._stop.set()
+        if cls._thread:
+            cls._thread.join(timeout=5)
+            cls._thread = None
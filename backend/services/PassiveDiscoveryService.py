@@ -0,0 +1,148 @@
+import ipaddress
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.scanner.arp_scanner import arp_sweep
+from backend.scanner.passive_listener import start_passive_listener
+from backend.services.DeviceService import DeviceService
+from backend.services.DiscoveryService import DiscoveryService
+from config.ConfigLoader import ConfigLoader
+
+
+class PassiveDiscoveryService:
+    """
+    Keeps the device cache current from ARP and DHCP traffic seen on the wire.
+
+    Every sighting marks the device online (adding it if unknown, following
+    it if DHCP moved it to a new IP). A confirmation loop actively ARPs only
+    the hosts that have been quiet for longer than `quiet_after` seconds and
+    marks the ones that do not answer as offline. Configured in config.json:
+
+        "passive_discovery": {"enabled": false, "iface": null,
+                              "quiet_after": 300, "confirm_interval": 60}
+    """
+
+    _last_seen = {}
+    _lock = threading.Lock()
+    _sniffer = None
+    _confirm_thread = None
+    _stop = threading.Event()
+    _started_at = 0.0
+
+    @classmethod
+    def _settings(cls) -> dict:
+        conf = ConfigLoader().get("passive_discovery", {})
+        return {
+            "enabled": bool(conf.get("enabled", False)),
+            "iface": conf.get("iface"),
+            "quiet_after": float(conf.get("quiet_after", 300)),
+            "confirm_interval": float(conf.get("confirm_interval", 60)),
+        }
+
+    @classmethod
+    def observe(cls, observation: dict) -> None:
+        """Applies one ARP/DHCP sighting to the device cache."""
+        ip, mac = observation["ip"], observation["mac"].lower()
+        with cls._lock:
+            cls._last_seen[mac] = time.time()
+
+        known = DeviceService.get_device_by_mac(mac) is not None
+        DeviceService.record_sighting(ip, mac, hostname=observation.get("hostname"))
+        if not known:
+            print(f"[+] Passive discovery: new device {ip} ({mac}) via {observation['source']}")
+
+    @classmethod
+    def quiet_hosts(cls, quiet_after: float) -> list[dict]:
+        """Online devices not seen on the wire for more than `quiet_after` seconds."""
+        now = time.time()
+        with cls._lock:
+            last_seen = dict(cls._last_seen)
+        return [
+            d for d in DeviceService.get_devices()
+            if d.get("device_status")
+            and now - last_seen.get((d.get("mac") or "").lower(), cls._started_at) > quiet_after
+        ]
+
+    @staticmethod
+    def _group_by_subnet(ips: list[str], iface: str = None) -> dict[str | None, list[str]]:
+        """Groups IPs by the interface of the scan target subnet holding them; others use `iface`."""
+        targets = [
+            (ipaddress.ip_network(t["cidr"]), t["iface"]) for t in DiscoveryService._scan_targets()
+        ]
+        groups = {}
+        for ip in ips:
+            address = ipaddress.ip_address(ip)
+            target_iface = next((i for network, i in targets if address in network), iface)
+            groups.setdefault(target_iface, []).append(ip)
+        return groups
+
+    @classmethod
+    def _confirm_group(cls, ips: list[str], iface: str | None) -> set[str]:
+        answered = set()
+        for reply in arp_sweep(hosts=ips, iface=iface):
+            answered.add(reply["ip"])
+            cls.observe({**reply, "source": "arp"})
+        return answered
+
+    @classmethod
+    def confirm_quiet_hosts(cls, quiet_after: float, iface: str = None) -> None:
+        """
+        Actively ARPs quiet hosts; those that stay silent are marked offline.
+
+        Hosts are swept per subnet, in parallel, from the interface attached
+        to it (see `DiscoveryService._scan_targets`); hosts outside every
+        scan target are swept from `iface`.
+        """
+        quiet = cls.quiet_hosts(quiet_after)
+        if not quiet:
+            return
+
+        groups = cls._group_by_subnet([d["ip"] for d in quiet], iface)
+        answered = set()
+        with ThreadPoolExecutor(len(groups), thread_name_prefix="passive-confirm") as pool:
+            for replies in pool.map(lambda group: cls._confirm_group(group[1], group[0]), groups.items()):
+                answered |= replies
+
+        for device in quiet:
+            if device["ip"] not in answered:
+                DeviceService.mark_offline(device["ip"])
+
+    @classmethod
+    def _confirm_loop(cls, settings: dict) -> None:
+        while not cls._stop.wait(settings["confirm_interval"]):
+            try:
+                cls.confirm_quiet_hosts(settings["quiet_after"], settings["iface"])
+            except Exception as e:
+                print(f"[!] Passive discovery confirmation failed: {e}")
+
+    @classmethod
+    def start(cls) -> None:
+        settings = cls._settings()
+        if not settings["enabled"] or cls._sniffer is not None:
+            return
+
+        cls._stop.clear()
+        cls._started_at = time.time()
+        try:
+            cls._sniffer = start_passive_listener(cls.observe, iface=settings["iface"])
+        except Exception as e:
+            print(f"[!] Passive discovery disabled: {e}")
+            return
+
+        cls._confirm_thread = threading.Thread(
+            target=cls._confirm_loop, args=(settings,), name="passive-confirm", daemon=True
+        )
+        cls._confirm_thread.start()
+        print("[+] Passive discovery started")
+
+    @classmethod
+    def stop(cls) -> None:
+        cls._stop.set()
+        if cls._sniffer is not None:
+            if cls._sniffer.running:
+                cls._sniffer.stop()
+            cls._sniffer = None
+        if cls._confirm_thread:
+            cls._confirm_thread.join(timeout=5)
+            cls._confirm_thread = None
@@ -0,0 +1,173 @@
+import ipaddress
+import threading
+import time
+import uuid
+
+from backend.services.DiscoveryService import DiscoveryService
+from backend.services.EventBus import EventBus
+
+
+class ScanJobService:
+    """
+    Runs discovery scans as background jobs.
+
+    A job is submitted, returns immediately with an ID, and runs the
+    discovery pipeline on its own thread. Progress and partial device results
+    are kept on the job and published on the 'scans' EventBus topic. A
+    request for subnets that a running job already covers joins that job
+    instead of starting a second scan.
+    """
+
+    MAX_FINISHED_JOBS = 50
+
+    _jobs = {}
+    _lock = threading.Lock()
+
+    class ScanJob:
+        def __init__(self, targets: list[dict]):
+            self.id = str(uuid.uuid4())
+            self.targets = targets
+            self.key = frozenset(t["cidr"] for t in targets)
+            self.status = "pending"
+            self.created_at = time.time()
+            self.started_at = None
+            self.finished_at = None
+            self.error = None
+            self.report = None
+            self.replies = 0
+            self.subnets_done = []
+            self.devices = []
+            self.changeset = None
+            self.cancel_event = threading.Event()
+            self.done = threading.Event()
+            self.lock = threading.Lock()
+
+        @property
+        def running(self) -> bool:
+            return self.status in ("pending", "running")
+
+        def to_dict(self, include_devices: bool = True) -> dict:
+            with self.lock:
+                data = {
+                    "id": self.id,
+                    "status": self.status,
+                    "subnets": sorted(self.key),
+                    "created_at": self.created_at,
+                    "started_at": self.started_at,
+                    "finished_at": self.finished_at,
+                    "progress": {
+                        "replies": self.replies,
+                        "devices": len(self.devices),
+                        "subnets_done": len(self.subnets_done),
+                        "subnets_total": len(self.targets),
+                    },
+                    "error": self.error,
+                    "report": self.report,
+                }
+                if include_devices:
+                    data["devices"] = list(self.devices)
+                    data["changeset"] = self.changeset
+            return data
+
+    @classmethod
+    def _publish(cls, scan_job: "ScanJobService.ScanJob", kind: str, **data) -> None:
+        EventBus.publish("scans", {"job_id": scan_job.id, "type": kind, **data})
+
+    @classmethod
+    def _targets_for(cls, subnets: list[str] | None) -> list[dict]:
+        targets = DiscoveryService._scan_targets()
+        if not subnets:
+            return targets
+
+        by_cidr = {t["cidr"]: t for t in targets}
+        requested = []
+        for subnet in subnets:
+            cidr = str(ipaddress.ip_network(subnet, strict=False))
+            requested.append(by_cidr.get(cidr, {"cidr": cidr, "iface": None}))
+        return requested
+
+    @classmethod
+    def _run(cls, job: "ScanJobService.ScanJob") -> None:
+        def progress(kind, data):
+            with job.lock:
+                if kind == "reply":
+                    job.replies += 1
+                elif kind == "subnet":
+                    job.subnets_done.append(data)
+                elif kind == "device":
+                    job.devices.append(data)
+            if kind == "device":
+                cls._publish(job, "device", device=data)
+            elif kind == "subnet":
+                cls._publish(job, "subnet", cidr=data)
+
+        with job.lock:
+            job.status = "running"
+            job.started_at = time.time()
+        cls._publish(job, "started")
+
+        try:
+            devices, report, changeset = DiscoveryService.run_scan(job.targets, progress, job.cancel_event)
+            with job.lock:
+                job.report = report
+                job.devices = devices
+                job.changeset = changeset
+                job.status = "cancelled" if report["cancelled"] else "completed"
+        except Exception as e:
+            print(f"[!] Scan job {job.id} failed: {e}")
+            with job.lock:
+                job.status = "failed"
+                job.error = str(e)
+        finally:
+            with job.lock:
+                job.finished_at = time.time()
+            job.done.set()
+            cls._publish(job, "finished", job=job.to_dict(include_devices=False))
+            cls._prune()
+
+    @classmethod
+    def _prune(cls) -> None:
+        with cls._lock:
+            finished = sorted(
+                (j for j in cls._jobs.values() if not j.running), key=lambda j: j.finished_at or 0
+            )
+            for job in finished[:-cls.MAX_FINISHED_JOBS]:
+                del cls._jobs[job.id]
+
+    @classmethod
+    def submit(cls, subnets: list[str] = None) -> tuple["ScanJobService.ScanJob", bool]:
+        """
+        Starts a scan of `subnets` (default: every discovery target).
+
+        Returns:
+            tuple: the job, and False if a running job already covering these
+            subnets was returned instead of starting a new one.
+        """
+        targets = cls._targets_for(subnets)
+        key = frozenset(t["cidr"] for t in targets)
+        with cls._lock:
+            for job in cls._jobs.values():
+                if job.running and key <= job.key:
+                    return job, False
+            job = cls.ScanJob(targets)
+            cls._jobs[job.id] = job
+
+        threading.Thread(target=cls._run, args=(job,), name=f"scan-{job.id[:8]}", daemon=True).start()
+        return job, True
+
+    @classmethod
+    def get(cls, job_id: str) -> "ScanJobService.ScanJob | None":
+        return cls._jobs.get(job_id)
+
+    @classmethod
+    def list_jobs(cls) -> list[dict]:
+        with cls._lock:
+            jobs = list(cls._jobs.values())
+        return [j.to_dict(include_devices=False) for j in sorted(jobs, key=lambda j: j.created_at, reverse=True)]
+
+    @classmethod
+    def cancel(cls, job_id: str) -> "ScanJobService.ScanJob | None":
+        job = cls._jobs.get(job_id)
+        if job and job.running:
+            job.cancel_event.set()
+        return job
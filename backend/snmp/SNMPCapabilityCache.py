@@ -0,0 +1,67 @@
+import threading
+import time
+
+from config.ConfigLoader import ConfigLoader
+
+
+class SNMPCapabilityCache:
+    """
+    Process wide cache of the SNMP version each host answers to.
+
+    Entries are keyed by IP and remember the MAC they were detected for; a
+    lookup with a different MAC (the address was handed to another device)
+    is treated as a miss. Successful detections and failures ("no SNMP")
+    expire after separate TTLs, configured in config.json:
+
+        "snmp_capability_cache": {"positive_ttl": 3600, "negative_ttl": 300}
+    """
+
+    _entries = {}
+    _lock = threading.Lock()
+
+    DEFAULT_POSITIVE_TTL = 3600
+    DEFAULT_NEGATIVE_TTL = 300
+
+    @classmethod
+    def _ttl(cls, positive: bool) -> float:
+        conf = ConfigLoader().get("snmp_capability_cache", {})
+        if positive:
+            return conf.get("positive_ttl", cls.DEFAULT_POSITIVE_TTL)
+        return conf.get("negative_ttl", cls.DEFAULT_NEGATIVE_TTL)
+
+    @classmethod
+    def get(cls, ip: str, mac: str = None) -> dict | None:
+        """
+        Returns the fresh cache entry for a host, or None on a miss.
+
+        The entry is a dict with 'version' ('v3', 'v2c' or None), 'mac',
+        'detected_at' (epoch seconds), 'expires_at' and 'error'.
+        """
+        with cls._lock:
+            entry = cls._entries.get(ip)
+            if entry is None:
+                return None
+            if entry["expires_at"] <= time.time():
+                cls._entries.pop(ip, None)
+                return None
+            if mac and entry["mac"] and entry["mac"].lower() != mac.lower():
+                return None
+            return dict(entry)
+
+    @classmethod
+    def store(cls, ip: str, mac: str | None, version: str | None, error: str = None) -> dict:
+        """Records a detection result; `version=None` stores a negative entry."""
+        now = time.time()
+        entry = {
+            "version": version,
+            "mac": mac,
+            "detected_at": now,
+            "expires_at": now + cls._ttl(version is not None),
+            "error": error,
+        }
+        with cls._lock:
+            previous = cls._entries.get(ip)
+            if not mac and previous:
+                entry["mac"] = previous["mac"]
+            cls._entries[ip] = entry
+        return dict(entry)
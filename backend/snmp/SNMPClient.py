@@ -0,0 +1,326 @@
+import re
+import socket
+import subprocess
+import threading
+from abc import ABC, abstractmethod
+
+from backend.snmp.SNMPTarget import SNMPTarget
+from backend.snmp.SNMPValue import SNMPValue
+from config.ConfigLoader import ConfigLoader
+
+try:
+    from pysnmp import hlapi
+except ImportError:  # pysnmp missing or not importable on this interpreter
+    hlapi = None
+
+
+class SNMPError(RuntimeError):
+    """Raised when an SNMP request times out or the agent returns an error status."""
+
+
+def normalize_oid(oid: str) -> str:
+    """Returns a numeric OID without the leading dot."""
+    return oid.strip().lstrip(".")
+
+
+class SNMPClient(ABC):
+    """
+    Common interface of the SNMP engines.
+
+    All methods take an `SNMPTarget` and return `SNMPValue` objects keyed by
+    numeric OID (no leading dot).
+    """
+
+    name = "abstract"
+
+    @abstractmethod
+    def get(self, target: SNMPTarget, oids: list[str]) -> dict[str, SNMPValue]:
+        """Performs a GET request for the given OIDs."""
+        pass
+
+    @abstractmethod
+    def bulk_walk(self, target: SNMPTarget, oid: str, max_repetitions: int = None) -> list[tuple[str, SNMPValue]]:
+        """
+        Walks a table column with GETBULK requests.
+
+        Returns (index, value) rows, where index is the OID suffix below `oid`
+        (e.g. '3' for ifPhysAddress.3). `max_repetitions` defaults to
+        `snmp.max_repetitions` in config.json.
+        """
+        pass
+
+    @staticmethod
+    def _max_repetitions(max_repetitions: int = None) -> int:
+        if max_repetitions is None:
+            max_repetitions = ConfigLoader().get("snmp", {}).get("max_repetitions", 25)
+        return max(1, int(max_repetitions))
+
+    @staticmethod
+    def _table_rows(oid: str, rows: list[tuple[str, SNMPValue]]) -> list[tuple[str, SNMPValue]]:
+        prefix = normalize_oid(oid) + "."
+        return [
+            (row_oid[len(prefix):], value)
+            for row_oid, value in rows
+            if row_oid.startswith(prefix) and not value.is_exception
+        ]
+
+    def get_many(self, target: SNMPTarget, oids: list[str], max_varbinds: int = None) -> dict[str, SNMPValue]:
+        """
+        Fetches many OIDs, packing up to `max_varbinds` varbinds into each GET PDU.
+
+        Most callers need a handful of OIDs and therefore pay a single round-trip.
+        The limit (`snmp.max_varbinds` in config.json) keeps requests below the
+        size at which agents answer with tooBig.
+        """
+        if max_varbinds is None:
+            max_varbinds = ConfigLoader().get("snmp", {}).get("max_varbinds", 32)
+
+        oids = [normalize_oid(oid) for oid in oids]
+        values = {}
+        for start in range(0, len(oids), max_varbinds):
+            values.update(self.get(target, oids[start:start + max_varbinds]))
+        return values
+
+
+class NativeSNMPClient(SNMPClient):
+    """
+    In-process SNMP engine built on pysnmp.
+
+    pysnmp's synchronous API drives a dispatcher bound to its `SnmpEngine`,
+    which is not safe to share between threads, so each thread lazily gets
+    its own engine.
+    """
+
+    name = "native"
+
+    _NATIVE_TYPES = {
+        "Integer": "Integer",
+        "Integer32": "Integer",
+        "Unsigned32": "Gauge32",
+        "Gauge32": "Gauge32",
+        "Counter32": "Counter32",
+        "Counter64": "Counter64",
+        "TimeTicks": "Timeticks",
+        "OctetString": "OctetString",
+        "Bits": "OctetString",
+        "Opaque": "Opaque",
+        "IpAddress": "IpAddress",
+        "ObjectIdentifier": "ObjectIdentifier",
+        "ObjectName": "ObjectIdentifier",
+        "Null": "Null",
+        "NoSuchObject": "NoSuchObject",
+        "NoSuchInstance": "NoSuchInstance",
+        "EndOfMibView": "EndOfMibView",
+    }
+
+    def __init__(self):
+        if hlapi is None:
+            raise RuntimeError("pysnmp is not available")
+        self._local = threading.local()
+
+    def _engine(self):
+        engine = getattr(self._local, "engine", None)
+        if engine is None:
+            engine = self._local.engine = hlapi.SnmpEngine()
+        return engine
+
+    @staticmethod
+    def _auth(target: SNMPTarget):
+        if target.version == "v3":
+            protocol = (
+                hlapi.usmHMACMD5AuthProtocol
+                if target.auth_protocol.upper() == "MD5"
+                else hlapi.usmHMACSHAAuthProtocol
+            )
+            return hlapi.UsmUserData(target.username, authKey=target.auth_key, authProtocol=protocol)
+        return hlapi.CommunityData(target.community, mpModel=1)
+
+    @staticmethod
+    def _transport(target: SNMPTarget):
+        return hlapi.UdpTransportTarget((target.ip, 161), timeout=target.timeout, retries=target.retries)
+
+    @classmethod
+    def _convert(cls, value) -> SNMPValue:
+        type_name = cls._NATIVE_TYPES.get(value.__class__.__name__)
+        if type_name is None:
+            # Subclasses defined by MIB modules, e.g. DisplayString
+            for base in value.__class__.__mro__:
+                type_name = cls._NATIVE_TYPES.get(base.__name__)
+                if type_name:
+                    break
+            else:
+                return SNMPValue("Opaque", bytes(value.asOctets()) if hasattr(value, "asOctets") else None)
+
+        if type_name in SNMPValue.INTEGER_TYPES:
+            return SNMPValue(type_name, int(value))
+        if type_name in ("OctetString", "Opaque"):
+            return SNMPValue(type_name, bytes(value.asOctets()))
+        if type_name == "IpAddress":
+            return SNMPValue(type_name, socket.inet_ntoa(bytes(value.asOctets())))
+        if type_name == "ObjectIdentifier":
+            return SNMPValue(type_name, str(value))
+        return SNMPValue(type_name, None)
+
+    @staticmethod
+    def _check(target: SNMPTarget, error_indication, error_status, error_index, var_binds):
+        if error_indication:
+            raise SNMPError(f"{target.ip}: {error_indication}")
+        if error_status:
+            at = var_binds[int(error_index) - 1][0] if error_index else "?"
+            raise SNMPError(f"{target.ip}: {error_status.prettyPrint()} at {at}")
+
+    def get(self, target: SNMPTarget, oids: list[str]) -> dict[str, SNMPValue]:
+        object_types = [hlapi.ObjectType(hlapi.ObjectIdentity(normalize_oid(oid))) for oid in oids]
+        error_indication, error_status, error_index, var_binds = next(hlapi.getCmd(
+            self._engine(), self._auth(target), self._transport(target), hlapi.ContextData(),
+            *object_types, lookupMib=False
+        ))
+        self._check(target, error_indication, error_status, error_index, var_binds)
+        return {str(name): self._convert(value) for name, value in var_binds}
+
+    def bulk_walk(self, target: SNMPTarget, oid: str, max_repetitions: int = None) -> list[tuple[str, SNMPValue]]:
+        rows = []
+        for error_indication, error_status, error_index, var_binds in hlapi.bulkCmd(
+            self._engine(), self._auth(target), self._transport(target), hlapi.ContextData(),
+            0, self._max_repetitions(max_repetitions),
+            hlapi.ObjectType(hlapi.ObjectIdentity(normalize_oid(oid))),
+            lexicographicMode=False, lookupMib=False
+        ):
+            self._check(target, error_indication, error_status, error_index, var_binds)
+            rows.extend((str(name), self._convert(value)) for name, value in var_binds)
+        return self._table_rows(oid, rows)
+
+
+class SubprocessSNMPClient(SNMPClient):
+    """
+    Fallback engine that forks the net-snmp command line tools.
+
+    Output is requested in a machine friendly form (numeric OIDs, raw
+    timeticks, hex strings) and parsed into `SNMPValue` objects so both
+    engines behave identically for callers.
+    """
+
+    name = "subprocess"
+
+    OUTPUT_OPTIONS = ["-On", "-Ot", "-Ox", "-Oe"]
+
+    _LINE = re.compile(r'^(\.?\d+(?:\.\d+)*)\s+=\s+(.*)$')
+    _TYPED = re.compile(r'^([\w-]+):\s*(.*)$')
+
+    _CLI_TYPES = {
+        "INTEGER": "Integer",
+        "Counter32": "Counter32",
+        "Counter64": "Counter64",
+        "Gauge32": "Gauge32",
+        "Timeticks": "Timeticks",
+        "STRING": "OctetString",
+        "Hex-STRING": "OctetString",
+        "OID": "ObjectIdentifier",
+        "IpAddress": "IpAddress",
+        "Opaque": "Opaque",
+    }
+
+    @staticmethod
+    def _auth_args(target: SNMPTarget) -> list[str]:
+        if target.version == "v3":
+            return [
+                "-v3", "-l", "authNoPriv",
+                "-u", target.username,
+                "-a", target.auth_protocol,
+                "-A", target.auth_key,
+            ]
+        return ["-v2c", "-c", target.community]
+
+    def _run(self, tool: str, target: SNMPTarget, oids: list[str], extra: list[str] = None) -> list[str]:
+        cmd = [
+            tool, *self._auth_args(target), *self.OUTPUT_OPTIONS, *(extra or []),
+            "-t", str(target.timeout), "-r", str(target.retries),
+            target.ip, *oids
+        ]
+        try:
+            result = subprocess.run(
+                cmd, capture_output=True, text=True,
+                timeout=target.timeout * (target.retries + 1) + 2
+            )
+        except subprocess.TimeoutExpired:
+            raise SNMPError(f"{target.ip}: {tool} timed out")
+        if result.returncode != 0:
+            raise SNMPError(f"{target.ip}: {tool} failed: {result.stderr.strip()}")
+        return result.stdout.splitlines()
+
+    @classmethod
+    def _parse_value(cls, raw: str) -> SNMPValue:
+        raw = raw.strip()
+        if raw.startswith("No Such Object"):
+            return SNMPValue("NoSuchObject", None)
+        if raw.startswith("No Such Instance"):
+            return SNMPValue("NoSuchInstance", None)
+        if raw.startswith("No more variables"):
+            return SNMPValue("EndOfMibView", None)
+        if raw == '""':
+            return SNMPValue("OctetString", b"")
+        if raw == "NULL":
+            return SNMPValue("Null", None)
+
+        m = cls._TYPED.match(raw)
+        if not m:
+            raise SNMPError(f"Unexpected SNMP output: {raw}")
+        cli_type, text = m.group(1), m.group(2).strip()
+        type_name = cls._CLI_TYPES.get(cli_type, "Opaque")
+
+        if type_name in SNMPValue.INTEGER_TYPES:
+            # -Oe keeps enums numeric; strip any unit suffix such as "octets"
+            return SNMPValue(type_name, int(text.split()[0].split("(")[-1].rstrip(")")))
+        if cli_type == "Hex-STRING" or type_name == "Opaque":
+            return SNMPValue(type_name, bytes.fromhex("".join(re.findall(r'[0-9A-Fa-f]{2}', text))))
+        if type_name == "OctetString":
+            return SNMPValue(type_name, text.strip('"').encode("utf-8"))
+        if type_name == "ObjectIdentifier":
+            return SNMPValue(type_name, normalize_oid(text))
+        return SNMPValue(type_name, text)
+
+    @classmethod
+    def _parse(cls, lines: list[str]) -> list[tuple[str, SNMPValue]]:
+        # Long hex strings wrap onto continuation lines without an OID prefix
+        entries = []
+        for line in lines:
+            m = cls._LINE.match(line)
+            if m:
+                entries.append([normalize_oid(m.group(1)), m.group(2)])
+            elif entries and line.strip():
+                entries[-1][1] += " " + line.strip()
+        return [(oid, cls._parse_value(raw)) for oid, raw in entries]
+
+    def get(self, target: SNMPTarget, oids: list[str]) -> dict[str, SNMPValue]:
+        lines = self._run("snmpget", target, [normalize_oid(oid) for oid in oids])
+        return dict(self._parse(lines))
+
+    def bulk_walk(self, target: SNMPTarget, oid: str, max_repetitions: int = None) -> list[tuple[str, SNMPValue]]:
+        extra = [f"-Cr{self._max_repetitions(max_repetitions)}"]
+        lines = self._run("snmpbulkwalk", target, [normalize_oid(oid)], extra)
+        return self._table_rows(oid, self._parse(lines))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_snmp_client() -> SNMPClient:
+    """
+    Returns the process wide SNMP engine selected by `snmp.engine` in config.json.
+
+    'native' (default) uses pysnmp in-process; 'subprocess' forks net-snmp.
+    If pysnmp cannot be loaded the subprocess engine is used as a fallback.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                engine = ConfigLoader().get("snmp", {}).get("engine", "native")
+                if engine == "native" and hlapi is not None:
+                    _client = NativeSNMPClient()
+                else:
+                    if engine == "native":
+                        print("[!] pysnmp unavailable, falling back to net-snmp subprocess engine")
+                    _client = SubprocessSNMPClient()
+    return _client
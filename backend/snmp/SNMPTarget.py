@@ -0,0 +1,63 @@
+from config.ConfigLoader import ConfigLoader
+
+
+class SNMPTarget:
+    """
+    Represents an SNMP agent together with the credentials used to query it.
+
+    Attributes:
+        ip (str): Agent IP address.
+        version (str): 'v2c' or 'v3'.
+        community (str): Community string (v2c only).
+        username (str): SNMPv3 username (authNoPriv).
+        auth_key (str): SNMPv3 authentication key.
+        auth_protocol (str): 'SHA' or 'MD5'.
+        timeout (float): Seconds to wait for a response.
+        retries (int): Number of retransmissions after a timeout.
+    """
+
+    def __init__(
+        self,
+        ip: str,
+        version: str = "v2c",
+        community: str = "public",
+        username: str = None,
+        auth_key: str = None,
+        auth_protocol: str = "SHA",
+        timeout: float = 3,
+        retries: int = 0
+    ):
+        if version not in ("v2c", "v3"):
+            raise ValueError(f"Unsupported SNMP version: {version}")
+        if version == "v3" and (not username or not auth_key):
+            raise ValueError("SNMPv3 requires username and auth_key")
+
+        self.ip = ip
+        self.version = version
+        self.community = community
+        self.username = username
+        self.auth_key = auth_key
+        self.auth_protocol = auth_protocol
+        self.timeout = timeout
+        self.retries = retries
+
+    def __repr__(self):
+        return f"SNMPTarget({self.ip!r}, {self.version!r})"
+
+    @classmethod
+    def from_config(cls, ip: str, version: str = "v2c", community: str = None) -> "SNMPTarget":
+        """Builds a target using the credentials and timeouts from config.json."""
+        config = ConfigLoader()
+        v3 = config.get("snmp_v3", {})
+        snmp = config.get("snmp", {})
+
+        return cls(
+            ip=ip,
+            version=version,
+            community=community or snmp.get("community", "public"),
+            username=v3.get("username", "admin"),
+            auth_key=v3.get("auth_key", "admin123"),
+            auth_protocol=v3.get("auth_protocol", "SHA"),
+            timeout=snmp.get("timeout", 3),
+            retries=snmp.get("retries", 0)
+        )
@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+
+class SNMPValue:
+    """
+    Represents the typed value of a single SNMP varbind.
+
+    Both SNMP engines (native pysnmp and the net-snmp CLI fallback) convert
+    their results into this class, so callers never deal with engine
+    specific objects or text output.
+
+    Attributes:
+        type (str): SMI type name, e.g. 'Timeticks', 'Counter32', 'OctetString'.
+        value: Python value - int for numeric types, bytes for OctetString,
+            str for ObjectIdentifier / IpAddress, None for exceptions.
+    """
+
+    INTEGER_TYPES = ("Integer", "Counter32", "Counter64", "Gauge32", "Timeticks")
+    EXCEPTION_TYPES = ("NoSuchObject", "NoSuchInstance", "EndOfMibView")
+
+    def __init__(self, type: str, value):
+        self.type = type
+        self.value = value
+
+    @property
+    def is_exception(self) -> bool:
+        """True if the agent answered with noSuchObject / noSuchInstance / endOfMibView."""
+        return self.type in self.EXCEPTION_TYPES
+
+    def __int__(self):
+        if self.type not in self.INTEGER_TYPES:
+            raise ValueError(f"{self.type} value is not numeric")
+        return int(self.value)
+
+    def __str__(self):
+        if self.type == "OctetString":
+            try:
+                text = self.value.decode("utf-8")
+            except UnicodeDecodeError:
+                return self.as_hex(":")
+            if all(c.isprintable() or c in "\r\n\t" for c in text):
+                return text
+            return self.as_hex(":")
+        if self.value is None:
+            return ""
+        return str(self.value)
+
+    def __repr__(self):
+        return f"SNMPValue({self.type}, {self.value!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, SNMPValue):
+            return NotImplemented
+        return self.type == other.type and self.value == other.value
+
+    def as_timedelta(self) -> timedelta:
+        """Converts a Timeticks value (hundredths of a second) to a timedelta."""
+        if self.type != "Timeticks":
+            raise ValueError(f"{self.type} value is not Timeticks")
+        return timedelta(seconds=self.value / 100)
+
+    def as_hex(self, separator: str = "") -> str:
+        """Returns an OctetString as lowercase hex, e.g. a MAC from ifPhysAddress."""
+        if self.type != "OctetString":
+            raise ValueError(f"{self.type} value is not an OctetString")
+        return separator.join(f"{b:02x}" for b in self.value)
@@ -0,0 +1,176 @@
+import bisect
+import csv
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from config.ConfigLoader import ConfigLoader
+
+# IEEE registry exports (https://standards-oui.ieee.org): file name -> assigned prefix length in bits
+REGISTRY_FILES = {
+    "oui.csv": 24,      # MA-L
+    "mam.csv": 28,      # MA-M
+    "oui36.csv": 36,    # MA-S
+}
+
+DEFAULT_OUI_SETTINGS = {
+    "registry_dir": "data/oui",
+    "index_path": "data/oui/oui_index.npz",
+    "http_fallback": False,
+}
+
+
+def mac_to_int(mac: str) -> int | None:
+    """48-bit integer value of a MAC in any common notation; None if it is not a MAC."""
+    digits = mac.replace(":", "").replace("-", "").replace(".", "")
+    if len(digits) != 12 or not digits.isalnum():
+        return None
+    try:
+        return int(digits, 16)
+    except ValueError:
+        return None
+
+
+class OUIDatabase:
+    """
+    Offline MAC vendor resolver built from the IEEE MA-L/MA-M/MA-S registries.
+
+    For each assigned prefix length the index holds a sorted uint64 array of
+    prefixes and a parallel int32 array of vendor ids; vendor names live in
+    one UTF-8 buffer addressed by an offsets array. A lookup is one binary
+    search per prefix length, longest first, so the most specific
+    assignment wins. Lookups bisect memoryviews of the arrays, avoiding
+    NumPy's per-call overhead. The compiled arrays are cached in an .npz
+    file and rebuilt when a registry file is newer than the cache.
+    """
+
+    def __init__(self, tables: dict, names: np.ndarray, offsets: np.ndarray):
+        # bits -> (prefixes, vendor ids), longest prefix first
+        self.tables = dict(sorted(tables.items(), reverse=True))
+        self.names = names
+        self.offsets = offsets
+        self._views = {
+            bits: (memoryview(np.ascontiguousarray(prefixes)), memoryview(np.ascontiguousarray(ids)))
+            for bits, (prefixes, ids) in self.tables.items()
+        }
+        self._name_bytes = names.tobytes()
+        self._offset_view = memoryview(np.ascontiguousarray(offsets))
+
+    def __len__(self) -> int:
+        return sum(len(prefixes) for prefixes, _ in self.tables.values())
+
+    def _name(self, vendor_id: int) -> str:
+        vendor_id = int(vendor_id)
+        start, end = self._offset_view[vendor_id], self._offset_view[vendor_id + 1]
+        return self._name_bytes[start:end].decode("utf-8")
+
+    def lookup(self, mac: str) -> str | None:
+        """Vendor name for `mac`, or None if no registry entry matches."""
+        value = mac_to_int(mac)
+        if value is None:
+            return None
+        for bits, (prefixes, vendor_ids) in self._views.items():
+            key = value >> (48 - bits)
+            i = bisect.bisect_left(prefixes, key)
+            if i < len(prefixes) and prefixes[i] == key:
+                return self._name(vendor_ids[i])
+        return None
+
+    @classmethod
+    def build(cls, registry_dir: str) -> "OUIDatabase":
+        """
+        Compiles the index from the IEEE CSV exports found in `registry_dir`.
+
+        Raises:
+            FileNotFoundError: If none of the registry files is present.
+        """
+        registry_dir = Path(registry_dir)
+        vendor_ids, names = {}, []
+        rows = {}
+        for filename, bits in REGISTRY_FILES.items():
+            path = registry_dir / filename
+            if not path.exists():
+                continue
+            with path.open("r", encoding="utf-8", newline="") as f:
+                for row in csv.DictReader(f):
+                    assignment = (row.get("Assignment") or "").strip()
+                    vendor = (row.get("Organization Name") or "").strip()
+                    if len(assignment) * 4 != bits or not vendor:
+                        continue
+                    if vendor not in vendor_ids:
+                        vendor_ids[vendor] = len(names)
+                        names.append(vendor)
+                    rows.setdefault(bits, {})[int(assignment, 16)] = vendor_ids[vendor]
+
+        if not rows:
+            raise FileNotFoundError(f"No IEEE registry files ({', '.join(REGISTRY_FILES)}) in {registry_dir}")
+
+        tables = {}
+        for bits, entries in rows.items():
+            prefixes = np.fromiter(entries.keys(), dtype=np.uint64, count=len(entries))
+            ids = np.fromiter(entries.values(), dtype=np.int32, count=len(entries))
+            order = np.argsort(prefixes)
+            tables[bits] = (prefixes[order], ids[order])
+
+        encoded = [n.encode("utf-8") for n in names]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(e) for e in encoded])
+        buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(tables, buffer, offsets)
+
+    def save(self, path: str) -> None:
+        arrays = {"names": self.names, "offsets": self.offsets}
+        for bits, (prefixes, ids) in self.tables.items():
+            arrays[f"prefixes_{bits}"] = prefixes
+            arrays[f"vendors_{bits}"] = ids
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "OUIDatabase":
+        with np.load(path) as data:
+            tables = {
+                int(key.split("_")[1]): (data[key], data[f"vendors_{key.split('_')[1]}"])
+                for key in data.files if key.startswith("prefixes_")
+            }
+            return cls(tables, data["names"], data["offsets"])
+
+    @classmethod
+    def open(cls, registry_dir: str, index_path: str) -> "OUIDatabase":
+        """Loads the cached index, rebuilding it first if a registry file is newer."""
+        index = Path(index_path)
+        sources = [p for p in (Path(registry_dir) / f for f in REGISTRY_FILES) if p.exists()]
+        if index.exists() and all(p.stat().st_mtime <= index.stat().st_mtime for p in sources):
+            return cls.load(index)
+
+        database = cls.build(registry_dir)
+        database.save(index)
+        print(f"[+] OUI index built: {len(database)} prefixes -> {index}")
+        return database
+
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def oui_settings() -> dict:
+    settings = dict(DEFAULT_OUI_SETTINGS)
+    settings.update(ConfigLoader().get("oui", {}))
+    return settings
+
+
+def get_oui_database() -> OUIDatabase | None:
+    """Process-wide OUI index; None if no registry files are installed."""
+    global _database
+    if _database is None:
+        with _database_lock:
+            if _database is None:
+                settings = oui_settings()
+                try:
+                    _database = OUIDatabase.open(settings["registry_dir"], settings["index_path"])
+                except (FileNotFoundError, OSError, ValueError) as e:
+                    print(f"[!] OUI database unavailable: {e}")
+                    _database = False
+    return _database if _database is not False else None
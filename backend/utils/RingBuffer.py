@@ -0,0 +1,57 @@
+import threading
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-size buffer of numeric samples backed by a preallocated NumPy array.
+
+    Each sample is one row with a value per field. Once the buffer is full
+    the oldest row is overwritten, so memory stays constant no matter how
+    long a device is polled.
+
+    Attributes:
+        fields (tuple[str]): Column names, e.g. ('time', 'in_kbps', 'out_kbps').
+        capacity (int): Maximum number of samples kept.
+    """
+
+    def __init__(self, capacity: int, fields: tuple = ("time", "in_kbps", "out_kbps")):
+        if capacity <= 0:
+            raise ValueError("Capacity must be positive")
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self._data = np.zeros((capacity, len(self.fields)), dtype=np.float64)
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, *values: float) -> None:
+        if len(values) != len(self.fields):
+            raise ValueError(f"Expected {len(self.fields)} values, got {len(values)}")
+        with self._lock:
+            self._data[self._next] = values
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def array(self, last: int = None) -> np.ndarray:
+        """Returns a copy of the newest `last` samples (all if None), oldest first."""
+        with self._lock:
+            count = self._count if last is None else max(0, min(last, self._count))
+            if count == 0:
+                return np.empty((0, len(self.fields)), dtype=np.float64)
+            indexes = (np.arange(self._next - count, self._next)) % self.capacity
+            return self._data[indexes].copy()
+
+    def latest(self) -> dict | None:
+        """Returns the newest sample as a dict, or None if the buffer is empty."""
+        rows = self.array(1)
+        if not len(rows):
+            return None
+        return dict(zip(self.fields, rows[0].tolist()))
+
+    def to_list(self, last: int = None) -> list[dict]:
+        return [dict(zip(self.fields, row)) for row in self.array(last).tolist()]
@@ -0,0 +1,46 @@
+def diff_devices(previous: list[dict], current: list[dict]) -> dict:
+    """
+    Compares two device lists by device id.
+
+    Args:
+        previous (list[dict]): device dicts before the change.
+        current (list[dict]): device dicts after the change.
+
+    Returns:
+        dict: changeset with
+            'added'   - devices only in `current`,
+            'removed' - devices only in `previous`,
+            'changed' - {'id', 'ip', 'fields': {name: {'old', 'new'}}, 'device'}
+                        for devices whose fields differ.
+    """
+    before = {d["id"]: d for d in previous}
+    after = {d["id"]: d for d in current}
+
+    changeset = {"added": [], "removed": [], "changed": []}
+    for device_id, device in after.items():
+        old = before.get(device_id)
+        if old is None:
+            changeset["added"].append(device)
+            continue
+        if old is device:
+            # Carried over untouched by the scan
+            continue
+        fields = {
+            key: {"old": old.get(key), "new": device.get(key)}
+            for key in old.keys() | device.keys()
+            if old.get(key) != device.get(key)
+        }
+        if fields:
+            changeset["changed"].append({"id": device_id, "ip": device["ip"], "fields": fields, "device": device})
+
+    changeset["removed"] = [d for device_id, d in before.items() if device_id not in after]
+    return changeset
+
+
+def is_empty(changeset: dict) -> bool:
+    return not (changeset["added"] or changeset["removed"] or changeset["changed"])
+
+
+def summarize(changeset: dict) -> dict:
+    """Number of added, removed and changed devices in a changeset."""
+    return {kind: len(changeset[kind]) for kind in ("added", "removed", "changed")}
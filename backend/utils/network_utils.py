@@ -2,20 +2,44 @@ import ipaddress
 import socket
 import psutil
 import requests
-import subprocess
-import re
 import netifaces
 
-def get_local_ip():
+from backend.snmp.SNMPClient import get_snmp_client, normalize_oid
+from backend.snmp.SNMPTarget import SNMPTarget
+from backend.snmp.SNMPValue import SNMPValue
+from backend.utils.OUIDatabase import get_oui_database, mac_to_int, oui_settings
+
+def get_local_subnets() -> list[dict]:
+    """
+    Lists every IPv4 subnet this host is attached to.
+
+    Loopback, link-local and host-only (/31, /32) addresses are skipped.
+
+    Returns:
+        list[dict]: {'iface', 'ip', 'cidr'} per interface address.
+    """
+    subnets = []
     for iface in netifaces.interfaces():
-        addrs = netifaces.ifaddresses(iface)
-        if netifaces.AF_INET in addrs:
-            for link in addrs[netifaces.AF_INET]:
-                ip = link.get('addr')
-                if ip and not ip.startswith("127."):
-                    if ip.startswith("192.168.100."):
-                        return ip
-    return "Not found"
+        for link in netifaces.ifaddresses(iface).get(netifaces.AF_INET, []):
+            ip, netmask = link.get('addr'), link.get('netmask')
+            if not ip or not netmask:
+                continue
+            address = ipaddress.IPv4Address(ip)
+            network = ipaddress.IPv4Network(f"{ip}/{netmask}", strict=False)
+            if address.is_loopback or address.is_link_local or network.prefixlen >= 31:
+                continue
+            subnets.append({'iface': iface, 'ip': ip, 'cidr': str(network)})
+    return subnets
+
+def get_local_ip():
+    """Returns the address on the default-route interface, or the first usable one."""
+    subnets = get_local_subnets()
+    default = netifaces.gateways().get('default', {}).get(netifaces.AF_INET)
+    if default:
+        for subnet in subnets:
+            if subnet['iface'] == default[1]:
+                return subnet['ip']
+    return subnets[0]['ip'] if subnets else "Not found"
 
 def get_netmask_for_ip(ip):
     """Finds the netmask for the given local IP by inspecting interfaces."""
@@ -33,7 +57,11 @@ def get_cidr_from_ip(ip, netmask=None):
     net = ipaddress.IPv4Network(f"{ip}/{netmask}", strict=False)
     return str(net)
 
-def get_vendor(mac):
+def _is_locally_administered(mac):
+    value = mac_to_int(mac)
+    return value is not None and bool((value >> 40) & 0x02)
+
+def get_vendor_online(mac):
     """Returns the vendor name from the MAC address using the macvendors API."""
     try:
         r = requests.get(f'https://api.macvendors.com/{mac}', timeout=3)
@@ -43,58 +71,51 @@ def get_vendor(mac):
         pass
     return "Unknown"
 
-def run_snmpwalk_v2c(ip: str, oid: str, community: str = 'public') -> list[str]:
-    """Run snmpwalk and return a list of output lines."""
-    cmd = ['snmpwalk', '-v2c', '-c', community, ip, oid]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise RuntimeError(f"snmpwalk failed: {result.stderr.strip()}")
-    return result.stdout.strip().splitlines()
+def get_vendor(mac):
+    """
+    Returns the vendor name for a MAC address from the local IEEE OUI index.
+
+    The macvendors API is only asked when `oui.http_fallback` is enabled in
+    config.json and the prefix is not in the local registry.
+    """
+    database = get_oui_database()
+    vendor = database.lookup(mac) if database else None
+    if vendor:
+        return vendor
+    # Randomized / locally administered addresses are in no registry
+    if oui_settings()["http_fallback"] and not _is_locally_administered(mac):
+        return get_vendor_online(mac)
+    return "Unknown"
+
+def run_snmpwalk_v2c(ip: str, oid: str, community: str = 'public', max_repetitions: int = None) -> list[tuple[str, SNMPValue]]:
+    """GETBULK-walk a table column with SNMPv2c and return (index, value) rows."""
+    target = SNMPTarget(ip, "v2c", community=community)
+    return get_snmp_client().bulk_walk(target, oid, max_repetitions)
 
-def run_snmpwalk_v3(ip: str, oid: str, username: str, auth_key: str, auth_protocol: str = 'SHA', priv_protocol: str = 'AES') -> list[str]:
+def run_snmpwalk_v3(ip: str, oid: str, username: str, auth_key: str, auth_protocol: str = 'SHA', priv_protocol: str = 'AES', max_repetitions: int = None) -> list[tuple[str, SNMPValue]]:
     """
-    Run snmpwalk using SNMPv3 and return the output lines.
+    GETBULK-walk a table column with SNMPv3 and return (index, value) rows.
 
     Default is authNoPriv (authentication only). For full authPriv, expand with privKey, etc.
     """
-    cmd = [
-        'snmpwalk', '-v3',
-        '-u', username,
-        '-l', 'authNoPriv',
-        '-a', auth_protocol,
-        '-A', auth_key,
-        ip, oid
-    ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise RuntimeError(f"snmpwalk v3 failed: {result.stderr.strip()}")
-    return result.stdout.strip().splitlines()
-
-
-
-
-def run_snmpget_v2c(ip: str, oid: str, community: str = 'public') -> str:
-    """Run snmpget and return the extracted value."""
-    cmd = ['snmpget', '-v2c', '-c', community, ip, oid]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise RuntimeError(f"snmpget failed: {result.stderr.strip()}")
-    line = result.stdout.strip()
-    match = re.search(r'=\s+\w+:\s+(.*)', line)
-    if not match:
-        raise ValueError(f"Unexpected snmpget output: {line}")
-    return match.group(1).strip()
-
-def run_snmpget_v3(ip: str, oid: str, username: str, auth_key: str, auth_protocol: str = "SHA") -> str:
-    cmd = ['snmpget', '-v3', '-l', 'authNoPriv', '-u', username, '-A', auth_key, '-a', auth_protocol, ip, oid]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise RuntimeError(f"snmpget v3 failed: {result.stderr.strip()}")
-    line = result.stdout.strip()
-    match = re.search(r'=\s+\w+:\s+(.*)', line)
-    if not match:
-        raise ValueError(f"Unexpected snmpget v3 output: {line}")
-    return match.group(1).strip()
+    target = SNMPTarget(ip, "v3", username=username, auth_key=auth_key, auth_protocol=auth_protocol)
+    return get_snmp_client().bulk_walk(target, oid, max_repetitions)
+
+
+def _single_value(target: SNMPTarget, oid: str) -> SNMPValue:
+    value = get_snmp_client().get(target, [oid]).get(normalize_oid(oid))
+    if value is None or value.is_exception:
+        raise ValueError(f"No value for {oid} on {target.ip}")
+    return value
+
+def run_snmpget_v2c(ip: str, oid: str, community: str = 'public') -> SNMPValue:
+    """Run an SNMPv2c GET and return the typed value."""
+    return _single_value(SNMPTarget(ip, "v2c", community=community), oid)
+
+def run_snmpget_v3(ip: str, oid: str, username: str, auth_key: str, auth_protocol: str = "SHA") -> SNMPValue:
+    """Run an SNMPv3 (authNoPriv) GET and return the typed value."""
+    target = SNMPTarget(ip, "v3", username=username, auth_key=auth_key, auth_protocol=auth_protocol)
+    return _single_value(target, oid)
 
 
 def mac_to_hex(mac: str) -> str:
@@ -123,24 +144,18 @@ def find_main_interface_index(
     if snmp_version == 'v3':
         if not username or not auth_key:
             raise ValueError("SNMPv3 requires username and auth_key")
-        lines = run_snmpwalk_v3(ip, oid, username, auth_key)
+        rows = run_snmpwalk_v3(ip, oid, username, auth_key)
     elif snmp_version == 'v2c':
-        lines = run_snmpwalk_v2c(ip, oid, community)
+        rows = run_snmpwalk_v2c(ip, oid, community)
     else:
         raise ValueError(f"Unsupported SNMP version: {snmp_version}")
 
     matches = []
-    for line in lines:
-        m = re.search(r'\.(\d+)\s+=\s+\w+:\s+(.+)', line)
-        if not m:
-            continue
-        index = int(m.group(1))
-        raw = m.group(2).strip()
-
-        parts = re.findall(r'[0-9a-fA-F]{1,2}', raw)
-        if not parts:
+    for row_index, value in rows:
+        if value.type != "OctetString" or not value.value:
             continue
-        hex_mac = ''.join(p.zfill(2) for p in parts).lower()
+        index = int(row_index)
+        hex_mac = value.as_hex()
 
         if mac_target in hex_mac:
             matches.append((index, hex_mac))
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Routes, Route, useLocation } from 'react-router-dom';
 import Topology from './components/Topology';
 import Sidebar from './components/Sidebar';
@@ -94,9 +94,17 @@ function App() {
   const location = useLocation();
   const [devices, setDevices] = useState([]);
 
+  const devicesEtag = useRef(null);
+
   const refreshDevices = async () => {
     try {
-      const res = await axios.get('http://localhost:8000/api/devices');
+      // Conditional GET: the server answers 304 while the device store version is unchanged
+      const res = await axios.get('http://localhost:8000/api/devices', {
+        headers: devicesEtag.current ? { 'If-None-Match': devicesEtag.current } : {},
+        validateStatus: (status) => status === 200 || status === 304,
+      });
+      if (res.status === 304) return;
+      devicesEtag.current = res.headers.etag || null;
       setDevices(res.data.devices || []);
     } catch (err) {
       console.error("Failed to refresh devices:", err);
@@ -105,19 +113,75 @@ function App() {
 
   useEffect(() => {
     refreshDevices();
-  }, []);
 
-  useEffect(() => {
-    if (location.pathname === '/') {
-      refreshDevices();
-    }
-  }, [location]);
+    // Device-state changes are pushed by the server instead of refetching
+    const source = new EventSource('http://localhost:8000/api/devices/stream?topics=devices');
+    source.addEventListener('devices', (event) => {
+      const change = JSON.parse(event.data);
+      if (change.type === 'snapshot') {
+        setDevices(change.devices || []);
+      } else if (change.type === 'updated') {
+        const same = (d) => (change.device.id ? d.id === change.device.id : d.ip === change.device.ip);
+        setDevices(prev => prev.map(d => (same(d) ? change.device : d)));
+      } else if (change.type === 'added') {
+        setDevices(prev => [...prev, change.device]);
+      } else if (change.type === 'changeset') {
+        // A scan only sends the devices that were added, removed or changed
+        const removed = new Set(change.removed.map(d => d.id));
+        const changed = new Map(change.changed.map(c => [c.id, c.device]));
+        setDevices(prev => [
+          ...prev.filter(d => !removed.has(d.id)).map(d => changed.get(d.id) || d),
+          ...change.added.filter(d => !prev.some(p => p.id === d.id)),
+        ]);
+      }
+    });
+    source.onerror = (err) => {
+      console.error('Device stream error:', err);
+    };
+
+    return () => source.close();
+  }, []);
 
   const triggerArpScan = async () => {
     try {
-      const res = await axios.post('http://localhost:8000/api/devices/scan');
-      setDevices(res.data.devices || []);
-      alert('ARP scan completed.');
+      // The scan runs as a server-side job; devices stream in as hosts are probed
+      const res = await axios.post('http://localhost:8000/api/devices/scans');
+      const jobId = res.data.job.id;
+      const source = new EventSource(`http://localhost:8000/api/devices/scans/${jobId}/stream`);
+
+      const mergeDevice = (device) => {
+        setDevices(prev => {
+          const rest = prev.filter(d => d.ip !== device.ip);
+          return [...rest, device];
+        });
+      };
+
+      const finish = (job) => {
+        source.close();
+        if (job.status === 'completed') {
+          alert('ARP scan completed.');
+        } else if (job.status === 'failed') {
+          alert('ARP scan failed.');
+        }
+      };
+
+      source.addEventListener('progress', (event) => {
+        const job = JSON.parse(event.data);
+        (job.devices || []).forEach(mergeDevice);
+        if (!['pending', 'running'].includes(job.status)) {
+          finish(job);
+        }
+      });
+      source.addEventListener('device', (event) => {
+        mergeDevice(JSON.parse(event.data).device);
+      });
+      source.addEventListener('finished', (event) => {
+        finish(JSON.parse(event.data).job);
+      });
+      source.onerror = (err) => {
+        console.error('Scan stream error:', err);
+        source.close();
+      };
     } catch (err) {
       console.error('ARP scan failed:', err);
       alert('ARP scan failed.');
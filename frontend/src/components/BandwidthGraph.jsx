@@ -1,5 +1,4 @@
-import React, { useEffect, useRef, useState } from 'react';
-import axios from 'axios';
+import React, { useEffect, useState } from 'react';
 import { Line } from 'react-chartjs-2';
 import {
   Chart as ChartJS,
@@ -17,31 +16,35 @@ ChartJS.register(LineElement, PointElement, LinearScale, TimeScale, Legend, Tool
 
 function BandwidthGraph({ ip, mac }) {
   const [dataPoints, setDataPoints] = useState([]);
-  const intervalRef = useRef(null);
 
   useEffect(() => {
-    const fetchBandwidth = async () => {
-      try {
-        const response = await axios.get(
-          `http://localhost:8000/api/devices/${ip}/bandwidth?mac=${mac}`
-        );
-        const { in_kbps, out_kbps } = response.data;
+    setDataPoints([]);
 
-        setDataPoints(prev => [
-          ...prev.slice(-59),
-          {
-            time: new Date(),
-            in_kbps,
-            out_kbps,
-          },
-        ]);
-      } catch (err) {
-        console.error('Error fetching bandwidth: ', err);
-      }
+    // Samples are pushed by the server's bandwidth poller; no polling here
+    const source = new EventSource(
+      `http://localhost:8000/api/devices/stream?topics=bandwidth&ip=${ip}`
+    );
+
+    source.addEventListener('bandwidth', (event) => {
+      const payload = JSON.parse(event.data);
+      const sample = payload.devices.find(d => d.ip === ip && d.mac === mac);
+      if (!sample) return;
+
+      setDataPoints(prev => [
+        ...prev.slice(-59),
+        {
+          time: new Date(payload.time * 1000),
+          in_kbps: sample.in_kbps,
+          out_kbps: sample.out_kbps,
+        },
+      ]);
+    });
+
+    source.onerror = (err) => {
+      console.error('Bandwidth stream error: ', err);
     };
 
-    intervalRef.current = setInterval(fetchBandwidth, 1000);
-    return () => clearInterval(intervalRef.current);
+    return () => source.close();
   }, [ip, mac]);
 
   const chartData = {
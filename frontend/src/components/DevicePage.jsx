@@ -1,5 +1,5 @@
 import { useParams } from 'react-router-dom';
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import TrafficPieChart from './TrafficPieChart';
 import BandwidthGraph from './BandwidthGraph';
 
@@ -16,6 +16,9 @@ function DevicePage({ onTypeChange }) {
   const [device, setDevice] = useState(null);
   const [menuOpen, setMenuOpen] = useState(false);
   const [submenuOpen, setSubmenuOpen] = useState(false);
+  const [enrichment, setEnrichment] = useState(null);
+  const pendingJob = useRef(null);
+  const finishedJobs = useRef(new Map());
 
   const fetchDevice = async () => {
     try {
@@ -32,20 +35,56 @@ function DevicePage({ onTypeChange }) {
     fetchDevice();
   }, [ip]);
 
+  const reportEnrichment = (job) => {
+    if (job.status === 'completed') {
+      alert(`Enrichment (${job.source}) completed.`);
+    } else {
+      alert(`Enrichment failed: ${job.error}`);
+    }
+  };
+
+  useEffect(() => {
+    // Enrichment runs as server-side jobs; follow the ones for this device
+    const source = new EventSource(`http://localhost:8000/api/devices/stream?topics=enrichment&ip=${ip}`);
+    source.addEventListener('enrichment', (event) => {
+      const { type, job } = JSON.parse(event.data);
+      if (job.device) {
+        setDevice(job.device);
+      }
+      if (type === 'finished') {
+        finishedJobs.current.set(job.id, job);
+      }
+      if (pendingJob.current !== job.id) return;
+      if (type === 'finished') {
+        pendingJob.current = null;
+        setEnrichment(null);
+        reportEnrichment(job);
+      } else {
+        setEnrichment(job);
+      }
+    });
+    source.onerror = (err) => {
+      console.error('Enrichment stream error:', err);
+    };
+    return () => source.close();
+  }, [ip]);
+
   const enrich = async (type) => {
     if (!device) return;
-    let url;
-    if (type === 'nmap') {
-      url = `http://localhost:8000/api/devices/enrich/nmap?ip=${device.ip}`;
-    } else if (type === 'snmp') {
-      url = `http://localhost:8000/api/devices/enrich/snmp?ip=${device.ip}`;
-    } else if (type === 'both') {
-      url = `http://localhost:8000/api/devices/enrich/both?ip=${device.ip}`;
-    }
+    // Requested from the UI, so it jumps ahead of background enrichment
+    const url = `http://localhost:8000/api/devices/enrich/${type}?ip=${device.ip}&priority=high`;
     try {
-      await fetch(url, { method: 'POST' });
-      await fetchDevice();
-      alert(`Enrichment (${type}) completed.`);
+      const res = await fetch(url, { method: 'POST' });
+      if (!res.ok) throw new Error((await res.json()).detail);
+      const { job } = await res.json();
+      const finished = finishedJobs.current.get(job.id);
+      if (finished) {
+        // Finished before the response arrived
+        reportEnrichment(finished);
+        return;
+      }
+      pendingJob.current = job.id;
+      setEnrichment(job);
     } catch (err) {
       alert(`Enrichment failed: ${err.message}`);
     }
@@ -85,7 +124,12 @@ function DevicePage({ onTypeChange }) {
   return (
     <div className="w-full min-h-screen bg-gray-900 text-white p-6 space-y-6 relative">
       {/* Menu */}
-      <div className="absolute top-4 right-4 z-50">
+      <div className="absolute top-4 right-4 z-50 flex items-start gap-2">
+        {enrichment && (
+          <span className="text-sm text-gray-400 px-2 py-1">
+            Enrichment ({enrichment.source}): {enrichment.status}…
+          </span>
+        )}
         <button
           onClick={() => setMenuOpen((prev) => !prev)}
           className="bg-gray-800 border border-gray-600 px-3 py-1 rounded shadow text-sm"
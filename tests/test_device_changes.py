@@ -0,0 +1,131 @@
+import pytest
+
+from backend.repository.DeviceStore import DeviceStore
+from backend.services.DeviceService import DeviceService
+from backend.services.EventBus import EventBus
+from config.ConfigLoader import ConfigLoader
+
+
+def make_device(device_id: str, ip: str, **fields) -> dict:
+    return {
+        "id": device_id, "ip": ip, "mac": f"aa:00:00:00:00:{ip.rsplit('.', 1)[1]:0>2}",
+        "type": "LANDevice", "tags": [], "hostname": "Unknown", "device_status": True, **fields,
+    }
+
+
+@pytest.fixture(autouse=True)
+def fresh_store(monkeypatch):
+    monkeypatch.setattr(DeviceService, "store", DeviceStore())
+    monkeypatch.setattr(DeviceService, "_change_log", None)
+    DeviceService.set_devices([make_device("a", "10.0.0.1")])
+
+
+def test_add_then_change_collapses_to_added_with_latest_state():
+    since = DeviceService.get_snapshot().token
+    DeviceService.add_device(make_device("b", "10.0.0.2"))
+    DeviceService.update_device(make_device("b", "10.0.0.2", hostname="printer"))
+
+    changes = DeviceService.changes_since(since)
+
+    assert not changes["full"]
+    assert [d["hostname"] for d in changes["added"]] == ["printer"]
+    assert changes["changed"] == [] and changes["removed"] == []
+
+
+def test_add_then_remove_cancels_out():
+    since = DeviceService.get_snapshot().token
+    DeviceService.add_device(make_device("b", "10.0.0.2"))
+    DeviceService.set_devices([DeviceService.get_device("a")])
+
+    changes = DeviceService.changes_since(since)
+
+    assert changes["added"] == [] and changes["changed"] == [] and changes["removed"] == []
+
+
+def test_remove_then_add_is_a_change():
+    since = DeviceService.get_snapshot().token
+    DeviceService.set_devices([])
+    DeviceService.add_device(make_device("a", "10.0.0.1", hostname="back"))
+
+    changes = DeviceService.changes_since(since)
+
+    assert [d["hostname"] for d in changes["changed"]] == ["back"]
+    assert changes["added"] == [] and changes["removed"] == []
+
+
+def test_scan_changeset_keeps_concurrent_writes_and_logs_what_was_applied():
+    since = DeviceService.get_snapshot().token
+    scanned_from = DeviceService.get_devices()
+    # Written while the scan runs
+    DeviceService.update_device(make_device("a", "10.0.0.1", hostname="enriched-host"))
+
+    changeset = {
+        "added": [],
+        "removed": [],
+        "changed": [{
+            "id": "a", "ip": "10.0.0.1", "device": {**scanned_from[0], "device_status": False},
+            "fields": {"device_status": {"old": True, "new": False}},
+        }],
+    }
+    DeviceService.apply_changeset(changeset)
+
+    stored = DeviceService.get_device("a")
+    assert stored["hostname"] == "enriched-host" and stored["device_status"] is False
+    assert DeviceService.changes_since(since)["changed"] == [stored]
+
+
+def test_version_from_the_future_falls_back_to_full_snapshot():
+    snapshot = DeviceService.get_snapshot()
+    changes = DeviceService.changes_since(f"{snapshot.epoch}-{snapshot.version + 5}")
+
+    assert changes["full"]
+    assert [d["id"] for d in changes["devices"]] == ["a"]
+
+
+def test_version_older_than_the_retained_log_falls_back_to_full_snapshot(monkeypatch):
+    get = ConfigLoader.get
+    monkeypatch.setattr(
+        ConfigLoader, "get",
+        lambda self, key, default=None: {"change_log_size": 2} if key == "device_store" else get(self, key, default),
+    )
+    monkeypatch.setattr(DeviceService, "_change_log", None)
+    old = DeviceService.get_snapshot().token
+    DeviceService.add_device(make_device("b", "10.0.0.2"))
+    recent = DeviceService.get_snapshot().token
+    DeviceService.add_device(make_device("c", "10.0.0.3"))
+    DeviceService.add_device(make_device("d", "10.0.0.4"))
+
+    # The log now holds only the last two writes
+    assert not DeviceService.changes_since(recent)["full"]
+    changes = DeviceService.changes_since(old)
+
+    assert changes["full"]
+    assert [d["id"] for d in changes["devices"]] == ["a", "b", "c", "d"]
+
+
+def test_version_from_another_store_falls_back_to_full_snapshot(monkeypatch):
+    since = DeviceService.get_snapshot().token
+    # A restarted server starts a new store whose versions catch up with the old token
+    monkeypatch.setattr(DeviceService, "store", DeviceStore())
+    DeviceService.set_devices([make_device("b", "10.0.0.2")])
+
+    assert DeviceService.get_snapshot().token != since
+    changes = DeviceService.changes_since(since)
+
+    assert changes["full"]
+    assert [d["id"] for d in changes["devices"]] == ["b"]
+
+
+def test_unchanged_update_keeps_version_and_publishes_nothing(monkeypatch):
+    # The first enrichment write derives the device's tags
+    DeviceService._write_enrichment(dict(DeviceService.get_device("a")), DeviceService.NMAP_FIELDS)
+    published = []
+    monkeypatch.setattr(EventBus, "publish", lambda topic, data: published.append(topic))
+    version = DeviceService.get_snapshot().version
+
+    DeviceService.update_device(dict(DeviceService.get_device("a")))
+    # e.g. nmap results served from the enrichment cache
+    DeviceService._write_enrichment(dict(DeviceService.get_device("a")), DeviceService.NMAP_FIELDS)
+
+    assert DeviceService.get_snapshot().version == version
+    assert published == []
@@ -0,0 +1,47 @@
+import pytest
+
+from backend.repository.DeviceStore import DeviceStore
+from backend.services.DeviceService import DeviceService
+from backend.services.DiscoveryService import DiscoveryService
+
+TARGETS = [{"cidr": "10.0.1.0/24", "iface": None}, {"cidr": "10.0.2.0/24", "iface": None}]
+ROUTER_MAC = "aa:bb:cc:00:00:01"
+
+
+@pytest.fixture
+def replies(monkeypatch):
+    replies = {
+        "10.0.1.0/24": [{"ip": "10.0.1.1", "mac": ROUTER_MAC}],
+        "10.0.2.0/24": [{"ip": "10.0.2.1", "mac": ROUTER_MAC}],
+    }
+    monkeypatch.setattr(DeviceService, "store", DeviceStore())
+    monkeypatch.setattr(DeviceService, "_change_log", None)
+    monkeypatch.setattr(
+        "backend.services.DiscoveryService.arp_sweep", lambda cidr, iface=None, stop=None: iter(replies[cidr])
+    )
+    monkeypatch.setattr(DiscoveryService, "_probe_host", staticmethod(lambda e: {**e, "snmp_version": None}))
+    return replies
+
+
+def stored() -> dict:
+    return {d["ip"]: d["id"] for d in DeviceService.get_devices()}
+
+
+def test_mac_answering_on_two_subnets_keeps_one_device_per_address(replies):
+    DiscoveryService.run_scan(TARGETS)
+    first = stored()
+
+    devices, _, _ = DiscoveryService.run_scan(TARGETS)
+
+    assert stored() == first and len(set(first.values())) == 2
+    assert sorted(d["id"] for d in devices) == sorted(first.values())
+
+
+def test_moved_host_keeps_the_id_of_the_address_that_went_silent(replies):
+    DiscoveryService.run_scan(TARGETS)
+    first = stored()
+    replies["10.0.2.0/24"] = [{"ip": "10.0.2.7", "mac": ROUTER_MAC}]
+
+    DiscoveryService.run_scan(TARGETS)
+
+    assert stored() == {"10.0.1.1": first["10.0.1.1"], "10.0.2.7": first["10.0.2.1"]}